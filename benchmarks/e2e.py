@@ -0,0 +1,640 @@
+"""
+End-to-end throughput benchmark of a synchronization run, without Google nor social networks.
+
+The real googleapiclient talks to a local fake People API (paginated listing, sync tokens, photo and fields updates,
+HTTP batches), social network lookups are replaced by adapters returning URLs of a local image server (ETag support,
+a part of pictures changing between runs), and a synthetic address book is generated for each size.
+Each size and mode runs in its own process, so peak RSS is measured for this run only.
+
+Usage:
+    python benchmarks/e2e.py --contacts 100 1000 10000 --modes serial concurrent async --runs 2
+"""
+
+import argparse
+import contextlib
+import email.parser
+import hashlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+# Run from a source checkout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Managed and not managed networks of synthetic contacts, with the part of contacts using them
+NETWORK_SHARES = {
+    "instagram": 0.4,
+    "facebook": 0.4,
+    "whatsapp": 0.3,
+    "skype": 0.05,
+}
+
+
+class Counter:
+    """
+    Thread-safe counters, by name.
+
+    Attributes
+    ----------
+    values : dict
+        value of each counter
+    lock : threading.Lock
+        protect values, when servers and workers count concurrently
+
+    Methods
+    -------
+    add(name, value)
+        Increase a counter.
+    """
+
+    def __init__(self):
+        """
+        Init counters.
+        """
+
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, value=1):
+        """
+        Increase a counter.
+        :param name: string
+        :param value: int|float
+        :return: void
+        """
+
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+
+class FakePeopleApi:
+    """
+    Local HTTP server answering People API calls used by the app, on a synthetic address book.
+
+    Attributes
+    ----------
+    contacts : list
+        persons of the address book, as returned by connections.list
+    latency : float
+        delay added to each HTTP request, in seconds (a batch is a single request)
+    page_size : int|None
+        maximum number of contacts by page, whatever the requested page size (None to use the requested one)
+    counter : Counter
+        requests by endpoint, and uploaded bytes
+    version : int
+        incremented on each contact update, used by sync tokens
+    server : ThreadingHTTPServer
+
+    Methods
+    -------
+    start()
+        Start the server in a thread, and return its URL.
+    handle(method, path, body)
+        Answer a single API call.
+    handle_batch(content_type, body)
+        Answer an HTTP batch request.
+    """
+
+    def __init__(self, contacts, latency=0.0, page_size=None):
+        """
+        Init the fake API.
+        :param contacts: list - persons of the address book
+        :param latency: float - delay added to each HTTP request, in seconds
+        :param page_size: int|None - maximum number of contacts by page (None to use the requested page size)
+        """
+
+        self.contacts = contacts
+        self.by_name = {person["resourceName"]: person for person in contacts}
+        self.latency = latency
+        self.page_size = page_size
+        self.counter = Counter()
+        self.version = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        """
+        Start the server in a thread, and return its URL.
+        :return: string
+        """
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_any(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                time.sleep(api.latency)
+
+                if urlsplit(self.path).path == '/batch':
+                    api.counter.add('api.batch')
+                    content_type, payload = api.handle_batch(self.headers['Content-Type'], body)
+                    status = 200
+                else:
+                    status, response = api.handle(self.command, self.path, body)
+                    content_type, payload = 'application/json', json.dumps(response).encode()
+
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_PATCH = do_POST = do_any
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return f'http://127.0.0.1:{self.server.server_port}/'
+
+    def handle(self, method, path, body):
+        """
+        Answer a single API call.
+        :param method: string - HTTP method
+        :param path: string - path and query string
+        :param body: bytes - JSON body
+        :return: tuple - HTTP status, and JSON response
+        """
+
+        url = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if method == 'GET' and url.path.endswith('/connections'):
+            self.counter.add('api.connections.list')
+            return 200, self.list_connections(query)
+
+        if method == 'PATCH' and url.path.endswith(':updateContactPhoto'):
+            self.counter.add('api.updateContactPhoto')
+            resource_name = url.path[len('/v1/'):-len(':updateContactPhoto')]
+            photo = json.loads(body)["photoBytes"]
+            self.counter.add('api.upload_bytes', len(photo) * 3 // 4)
+            return 200, {"person": self.update(resource_name, {})}
+
+        if method == 'POST' and url.path.endswith(':batchUpdateContacts'):
+            self.counter.add('api.batchUpdateContacts')
+            contacts = json.loads(body)["contacts"]
+
+            # Like Google, reject the call if a contact has changed since its etag has been read
+            stale = [resource_name for resource_name, fields in contacts.items() if fields.get('etag') != self.by_name[resource_name]["etag"]]
+            if len(stale):
+                self.counter.add('api.stale_etags', len(stale))
+                return 400, {"error": {"code": 400, "message": f'Request person.etag is different than the current person.etag: {stale[0]}', "status": 'FAILED_PRECONDITION'}}
+
+            return 200, {"updateResult": {
+                resource_name: {"person": self.update(resource_name, fields)} for resource_name, fields in contacts.items()
+            }}
+
+        return 404, {"error": {"code": 404, "message": f'{method} {url.path} not found'}}
+
+    def list_connections(self, query):
+        """
+        Return a page of contacts. With a sync token, only contacts updated since this token are returned.
+        :param query: dict - query parameters
+        :return: dict
+        """
+
+        contacts = self.contacts
+        if query.get('syncToken'):
+            since = int(query['syncToken'])
+            contacts = [person for person in contacts if person["_version"] > since]
+
+        start = int(query.get('pageToken') or 0)
+        size = int(query.get('pageSize') or 100)
+        if self.page_size:
+            size = min(size, self.page_size)
+        page = [{key: value for key, value in person.items() if not key.startswith('_')} for person in contacts[start:start + size]]
+
+        result = {"connections": page, "totalItems": len(contacts)}
+        if start + size < len(contacts):
+            result["nextPageToken"] = str(start + size)
+        else:
+            result["nextSyncToken"] = str(self.version)
+
+        return result
+
+    def update(self, resource_name, fields):
+        """
+        Update a contact, changing its etag.
+        :param resource_name: string
+        :param fields: dict - person fields to set
+        :return: dict - updated person
+        """
+
+        with self.lock:
+            self.version += 1
+            person = self.by_name[resource_name]
+            for key, value in fields.items():
+                if key != 'etag':
+                    person[key] = value
+            person["_version"] = self.version
+            person["etag"] = f'e{self.version}'
+
+        return {"resourceName": resource_name, "etag": person["etag"], "names": person["names"]}
+
+    def handle_batch(self, content_type, body):
+        """
+        Answer an HTTP batch request: each part is a single API call.
+        :param content_type: string - multipart content type, with its boundary
+        :param body: bytes
+        :return: tuple - content type, and multipart body
+        """
+
+        message = email.parser.BytesParser().parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+        boundary = uuid.uuid4().hex
+        parts = []
+
+        for part in message.get_payload():
+            request = part.get_payload(decode=False)
+            head, _, request_body = request.replace('\r\n', '\n').partition('\n\n')
+            method, path, _ = head.split('\n', 1)[0].split(' ', 2)
+
+            status, response = self.handle(method, path, request_body.encode())
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n'
+                f'HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(response)}\r\n'
+            )
+
+        payload = (''.join(parts) + f'--{boundary}--\r\n').encode()
+
+        return f'multipart/mixed; boundary={boundary}', payload
+
+
+class FakeImageServer:
+    """
+    Local HTTP server of profile pictures, with ETag revalidation.
+    Pictures are taken from a pool of generated JPEGs, with a comment segment unique to each user and version, so
+    each user gets different bytes (and content hash).
+
+    Attributes
+    ----------
+    pool : list
+        JPEG contents
+    versions : dict
+        version of the picture of each user, incremented by change()
+    latency : float
+        delay added to each request, in seconds
+    counter : Counter
+        requests by status, and served bytes
+
+    Methods
+    -------
+    start()
+        Start the server in a thread, and return its URL.
+    change(rate, seed)
+        Change the picture of a part of users.
+    """
+
+    def __init__(self, pool_size, latency=0.0):
+        """
+        Generate the pictures pool.
+        :param pool_size: int - number of different pictures
+        :param latency: float - delay added to each request, in seconds
+        """
+
+        rng = random.Random(0)
+        self.pool = []
+        for _ in range(pool_size):
+
+            # Blocks of random colors, at a usual profile picture size
+            side = rng.choice([320, 640, 1080])
+            img = Image.new('RGB', (8, 8))
+            img.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(64)])
+            buffer = io.BytesIO()
+            img.resize((side, side), Image.BILINEAR).save(buffer, 'JPEG', quality=90)
+            self.pool.append(buffer.getvalue())
+
+        self.versions = {}
+        self.latency = latency
+        self.counter = Counter()
+
+    def start(self):
+        """
+        Start the server in a thread, and return its URL.
+        :return: string
+        """
+
+        images = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(images.latency)
+                user = urlsplit(self.path).path.strip('/')
+                version = images.versions.get(user, 0)
+                index = int(hashlib.md5(f'{user}/{version}'.encode()).hexdigest(), 16) % len(images.pool)
+                etag = f'"{index}-{version}"'
+
+                if self.headers.get('If-None-Match') == etag:
+                    images.counter.add('images.304')
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                # Insert a comment segment after the JPEG start marker
+                comment = f'{user}/{version}'.encode()
+                content = images.pool[index]
+                content = content[:2] + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + comment + content[2:]
+
+                images.counter.add('images.200')
+                images.counter.add('images.bytes', len(content))
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return f'http://127.0.0.1:{server.server_port}/'
+
+    def change(self, users, rate, seed):
+        """
+        Change the picture of a part of users.
+        :param users: list - user keys ('network/user_name')
+        :param rate: float - part of users to change
+        :param seed: int
+        :return: void
+        """
+
+        rng = random.Random(seed)
+        for user in users:
+            if rng.random() < rate:
+                self.versions[user] = self.versions.get(user, 0) + 1
+
+
+def generate_contacts(count, seed=0):
+    """
+    Generate a synthetic address book.
+    :param count: int - number of contacts
+    :param seed: int
+    :return: list - persons, as returned by connections.list
+    """
+
+    rng = random.Random(seed)
+    contacts = []
+
+    for i in range(count):
+        im_clients = [
+            {"protocol": network.capitalize() if network != "whatsapp" else "WhatsApp", "username": f'{network[:2]}{i}'}
+            for network, share in NETWORK_SHARES.items() if rng.random() < share
+        ]
+
+        person = {
+            "resourceName": f'people/c{i}',
+            "etag": 'e0',
+            "names": [{"displayName": f'Contact {i}'}],
+            "photos": [{"url": 'https://lh3.googleusercontent.com/default', "default": True}],
+            "_version": 0,
+        }
+        if im_clients:
+            person["imClients"] = im_clients
+        contacts.append(person)
+
+    return contacts
+
+
+def get_stages(metrics):
+    """
+    Return busy time, calls and errors of each stage of a run, all networks together. Times of concurrent calls are
+    summed, and 'fetch' includes 'lookup' and 'download'.
+    :param metrics: Metrics - metrics of the run
+    :return: dict - 'seconds', 'calls' and 'errors', by stage name
+    """
+
+    stages = {}
+    for item in metrics.to_dict()["stages"]:
+        values = stages.setdefault(item["stage"], {"seconds": 0.0, "calls": 0, "errors": 0})
+        values["seconds"] += item["seconds"]
+        values["calls"] += item["calls"]
+        values["errors"] += sum(item["errors"].values())
+
+    return {name: {"seconds": round(values["seconds"], 3), "calls": values["calls"], "errors": values["errors"]}
+            for name, values in sorted(stages.items())}
+
+
+def get_http_stats(before, after):
+    """
+    Return statistics of the shared HTTP client during a run, by host.
+    :param before: dict - returned by Metrics.get_http_stats(), before the run
+    :param after: dict - returned by Metrics.get_http_stats(), after the run
+    :return: dict - 'requests', 'retries', 'errors' and 'connections' (opened during the run), and 'pool_maxsize'
+    """
+
+    stats = {}
+    for host, values in sorted(after.items()):
+        previous = before.get(host, {})
+        stats[host] = {key: value - previous.get(key, 0) for key, value in values.items() if key != 'pool_maxsize'}
+        stats[host]["pool_maxsize"] = values.get("pool_maxsize")
+
+    return stats
+
+
+def run_child(args):
+    """
+    Run the benchmark for a single size and mode, and print results as JSON.
+    :param args: argparse.Namespace
+    :return: void
+    """
+
+    workdir = tempfile.mkdtemp(prefix='richgcontacts-bench-')
+
+    # Point user data and API files to the working folder, before any shared object is instantiated
+    import richgcontacts.globals
+    richgcontacts.globals.root = workdir
+    richgcontacts.globals.userdata_path = os.path.join(workdir, 'userdata/')
+    os.makedirs(os.path.join(workdir, 'data'))
+
+    from google.oauth2.credentials import Credentials
+    from googleapiclient import discovery_cache
+    from googleapiclient.discovery import build_from_document
+
+    from richgcontacts import core, networks
+    from richgcontacts.metrics import Metrics
+    from richgcontacts.networks.adapter import NetworkAdapter
+    from richgcontacts.rate_limiter import RateLimiter
+    from richgcontacts.social import Social
+
+    for name, module in list(sys.modules.items()):
+        if name.startswith('richgcontacts') and hasattr(module, 'userdata_path'):
+            module.root = richgcontacts.globals.root
+            module.userdata_path = richgcontacts.globals.userdata_path
+
+    contacts = generate_contacts(args.contacts, seed=args.seed)
+    api = FakePeopleApi(contacts, latency=args.api_latency, page_size=args.page_size)
+    api_url = api.start()
+    images = FakeImageServer(args.pool, latency=args.image_latency)
+    images_url = images.start()
+    lookups = Counter()
+
+    # Build the real API client on the fake API
+    document = json.loads(discovery_cache.get_static_doc('people', 'v1'))
+    document["rootUrl"] = api_url
+
+    def connect_api(self):
+        self.creds = Credentials(token='benchmark')
+        self.service = build_from_document(document, credentials=self.creds)
+
+    core.PeopleApi.connect_api = connect_api
+
+    # Replace social networks lookups, without importing their packages
+    class BenchAdapter(NetworkAdapter):
+
+        def __init__(self, network_name):
+            super().__init__()
+            self.network_name = network_name
+
+        def get_profile_picture_url(self, user_name):
+            time.sleep(args.lookup_latency)
+            lookups.add(f'lookups.{self.network_name}')
+
+            # Some Facebook profiles show a birthday
+            birthday = None
+            if self.network_name == 'facebook' and int(user_name[2:]) % 4 == 0:
+                birthday = {"month": 1 + int(user_name[2:]) % 12, "day": 1 + int(user_name[2:]) % 28, "year": 1990}
+
+            return {
+                "success": True,
+                "error": None,
+                "url": f'{images_url}{self.network_name}/{user_name}',
+                "birthday": birthday,
+            }
+
+    for name in networks.ADAPTERS:
+        networks.INSTANCES[name] = BenchAdapter(name)
+        if not args.rate_limits:
+            Social.RATE_LIMITERS[name] = RateLimiter(rate=None)
+
+    users = [f'{network}/{client["username"]}' for person in contacts for client in person.get("imClients", [])
+             for network in [client["protocol"].lower()]]
+
+    results = []
+    for run in range(args.runs):
+
+        # Change a part of pictures between runs
+        if run > 0:
+            images.change(users, args.change_rate, seed=args.seed + run)
+
+        before = dict(api.counter.values, **images.counter.values, **lookups.values)
+        http_before = Metrics.get_http_stats()
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            core.main(
+                incremental=args.incremental and run > 0,
+                concurrent=args.mode == 'concurrent',
+                asynchronous=args.mode == 'async',
+            )
+        wall = time.perf_counter() - start
+
+        after = dict(api.counter.values, **images.counter.values, **lookups.values)
+        results.append({
+            "run": run + 1,
+            "wall_seconds": round(wall, 3),
+            "contacts_per_second": round(args.contacts / wall, 1) if wall else None,
+            "stages": get_stages(Metrics.CURRENT),
+            "requests": {name: after[name] - before.get(name, 0) for name in sorted(after) if after[name] - before.get(name, 0)},
+            "http": get_http_stats(http_before, Metrics.get_http_stats()),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+
+    print(json.dumps({"contacts": args.contacts, "mode": args.mode, "runs": results}))
+
+
+def print_report(result):
+    """
+    Print the results of a size and mode.
+    :param result: dict - printed by run_child()
+    :return: void
+    """
+
+    for run in result["runs"]:
+        print(f'{result["contacts"]:>7} contacts  {result["mode"]:<10}  run {run["run"]}:  '
+              f'{run["wall_seconds"]:>8.2f} s  {run["contacts_per_second"]:>9.1f} contacts/s  peak RSS {run["peak_rss_mb"]:.0f} MB')
+        for name, values in run["stages"].items():
+            print(f'{"":>24}{name:<16}{values["seconds"]:>9.3f} s busy  {values["calls"]:>8} calls  {values["errors"]:>6} errors')
+        print(f'{"":>24}requests: ' + ', '.join(f'{name}={value}' for name, value in run["requests"].items()))
+        for host, values in run.get("http", {}).items():
+            print(f'{"":>24}http {host}: ' + ', '.join(f'{name}={value}' for name, value in values.items()))
+
+
+def main():
+    """
+    Parse arguments, and run each size and mode in its own process.
+    :return: void
+    """
+
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of a synchronization run, on local fake services.')
+    parser.add_argument('--contacts', type=int, nargs='+', default=[100, 1000], help='address book sizes (up to 50000)')
+    parser.add_argument('--modes', nargs='+', default=['serial', 'concurrent', 'async'], choices=['serial', 'concurrent', 'async'])
+    parser.add_argument('--runs', type=int, default=2, help='runs on the same data: next runs revalidate cached pictures')
+    parser.add_argument('--change-rate', type=float, default=0.1, help='part of pictures changed between runs')
+    parser.add_argument('--incremental', action='store_true', help='use sync tokens for runs after the first one')
+    parser.add_argument('--api-latency', type=float, default=0.02, help='People API latency per request, in seconds')
+    parser.add_argument('--lookup-latency', type=float, default=0.05, help='social network lookup latency, in seconds')
+    parser.add_argument('--page-size', type=int, help='maximum contacts by page of the fake People API (default: 1000, requested by the app)')
+    parser.add_argument('--image-latency', type=float, default=0.02, help='image server latency per request, in seconds')
+    parser.add_argument('--pool', type=int, default=64, help='number of different generated pictures')
+    parser.add_argument('--rate-limits', action='store_true', help='keep the configured social networks rate limits')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.contacts = args.contacts[0]
+        return run_child(args)
+
+    results = []
+    for contacts in args.contacts:
+        for mode in args.modes:
+            command = [sys.executable, __file__, '--child', '--mode', mode, '--contacts', str(contacts)]
+            for name in ['runs', 'change_rate', 'api_latency', 'lookup_latency', 'image_latency', 'pool', 'seed']:
+                command += ['--' + name.replace('_', '-'), str(getattr(args, name))]
+            if args.page_size:
+                command += ['--page-size', str(args.page_size)]
+            if args.incremental:
+                command.append('--incremental')
+            if args.rate_limits:
+                command.append('--rate-limits')
+
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print_report(result)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Microbenchmarks of CPU-side hot paths: contacts filtering, image scoring, history reads and duplicates detection.
+
+Fixtures are generated in a temporary user data folder (synthetic People API payloads, an image store with long user
+histories, large JPEGs), so it runs offline. For each case, per-call latency (median and 95th percentile) and the
+peak of Python memory allocations during one call are reported.
+Results can be saved, and compared to saved results, to fail on regressions.
+
+Usage:
+    python benchmarks/micro.py --save baseline.json
+    python benchmarks/micro.py --compare baseline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+# Run from a source checkout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from e2e import generate_contacts
+
+
+def use_workdir(workdir):
+    """
+    Point user data of all app modules to a working folder, before any shared object is instantiated.
+    :param workdir: string
+    :return: void
+    """
+
+    import richgcontacts.globals
+    richgcontacts.globals.root = workdir
+    richgcontacts.globals.userdata_path = os.path.join(workdir, 'userdata/')
+
+    from richgcontacts import core, social  # noqa: F401 - import modules using userdata_path
+
+    for name, module in list(sys.modules.items()):
+        if name.startswith('richgcontacts') and hasattr(module, 'userdata_path'):
+            module.root = richgcontacts.globals.root
+            module.userdata_path = richgcontacts.globals.userdata_path
+
+
+def make_jpeg(path, size, seed, quality=90):
+    """
+    Write a JPEG with random content.
+    :param path: string
+    :param size: tuple - width and height
+    :param seed: int
+    :param quality: int
+    :return: void
+    """
+
+    rng = random.Random(seed)
+    img = Image.new('RGB', (16, 12))
+    img.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(16 * 12)])
+    img = img.resize(size, Image.BILINEAR)
+
+    # Add grain, so the file has the size of a real photo
+    noise = Image.effect_noise(size, 32).convert('RGB')
+    Image.blend(img, noise, 0.15).save(path, 'JPEG', quality=quality)
+
+
+def store_raw(store, content_path):
+    """
+    Put a file in the image store without indexing it, like images stored by previous versions.
+    :param store: ImageStore
+    :param content_path: string - file to copy
+    :return: string - hash of the image content
+    """
+
+    digest = store.hash_file(content_path)
+    image_path = store.get_image_path(digest)
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with open(content_path, 'rb') as source, open(image_path, 'wb') as target:
+        target.write(source.read())
+
+    return digest
+
+
+def set_history(store, network_name, user_name, digests):
+    """
+    Replace the history of a user (first digest is the oldest).
+    :param store: ImageStore
+    :param network_name: string
+    :param user_name: string
+    :param digests: list
+    :return: void
+    """
+
+    store.database.execute('DELETE FROM history WHERE network_name = ? AND user_name = ?', (network_name, user_name))
+    store.database.execute_many(
+        'INSERT INTO history (network_name, user_name, digest, date) VALUES (?, ?, ?, ?)',
+        [(network_name, user_name, digest, 1e9 + i) for i, digest in enumerate(digests)]
+    )
+
+
+def build_cases(args, workdir):
+    """
+    Generate fixtures, and return benchmark cases.
+    :param args: argparse.Namespace
+    :param workdir: string - temporary folder
+    :return: list - dict with 'name', 'function', 'setup' (or None) and 'items' (items processed by a call)
+    """
+
+    from richgcontacts import core
+    from richgcontacts.social import Social
+
+    store = Social.get_store()
+    fixtures = os.path.join(workdir, 'fixtures')
+    os.makedirs(fixtures)
+    cases = []
+
+    def social(network_name, user_name):
+        # Skip adapter instantiation: these methods only use the image store
+        obj = Social.__new__(Social)
+        obj.network_name = network_name
+        obj.user_name = user_name
+        return obj
+
+    # Synthetic People API payloads
+    contacts = generate_contacts(args.contacts)
+    cases.append({
+        "name": f'filter_contacts[{args.contacts} contacts]',
+        "function": lambda: sum(1 for _ in core.filter_contacts(contacts)),
+        "setup": None,
+        "items": args.contacts,
+    })
+
+    # Images of a contact on several networks, at usual profile pictures sizes
+    images = []
+    for i, side in enumerate([150, 320, 640, 1080, 2048]):
+        path = os.path.join(fixtures, f'profile-{i}.jpg')
+        make_jpeg(path, (side, side), seed=i)
+        digest = store.add_file(path)
+        images.append({"network_name": ["instagram", "facebook", "whatsapp"][i % 3], "image_path": store.get_image_path(digest), "image_date": 1e9 + i})
+
+    for count in [2, 5]:
+        cases.append({
+            "name": f'choose_best_image[{count} images, cached metadata]',
+            "function": lambda count=count: core.choose_best_image(images[:count]),
+            "setup": None,
+            "items": 1,
+        })
+        cases.append({
+            "name": f'choose_best_image[{count} images, metadata from database]',
+            "function": lambda count=count: core.choose_best_image(images[:count]),
+            "setup": lambda: store.metadata.entries.clear(),
+            "items": 1,
+        })
+
+    # Long histories, with other users in the same table
+    digests = [image["image_path"] for image in images]
+    digests = [store.get_digest(path) for path in digests]
+    for user in range(args.users):
+        set_history(store, 'instagram', f'user{user}', [digests[(user + i) % len(digests)] for i in range(args.history)])
+
+    user = social('instagram', 'user0')
+    cases.append({
+        "name": f'get_profile_pictures[last, {args.history} entries, {args.users} users]',
+        "function": lambda: user.get_profile_pictures(get_only_last=True),
+        "setup": None,
+        "items": 1,
+    })
+    cases.append({
+        "name": f'get_profile_pictures[all, {args.history} entries, {args.users} users]',
+        "function": lambda: user.get_profile_pictures(get_only_last=False),
+        "setup": None,
+        "items": args.history,
+    })
+
+    # Last two images of a history: the same picture re-encoded (so another content hash), or another picture
+    large = (args.large_width, args.large_width * 3 // 4)
+    make_jpeg(os.path.join(fixtures, 'large.jpg'), large, seed=100, quality=95)
+    with Image.open(os.path.join(fixtures, 'large.jpg')) as img:
+        img.save(os.path.join(fixtures, 'large-recompressed.jpg'), 'JPEG', quality=70)
+    make_jpeg(os.path.join(fixtures, 'large-other.jpg'), large, seed=101, quality=95)
+
+    original = store_raw(store, os.path.join(fixtures, 'large.jpg'))
+    recompressed = store_raw(store, os.path.join(fixtures, 'large-recompressed.jpg'))
+    other = store_raw(store, os.path.join(fixtures, 'large-other.jpg'))
+    older = [digests[i % len(digests)] for i in range(args.history - 2)]
+
+    def duplicates_case(name, previous, last, indexed):
+        obj = social('facebook', name)
+
+        def setup():
+            set_history(store, 'facebook', name, older + [previous, last])
+            if not indexed:
+                store.database.execute('DELETE FROM phashes WHERE digest IN (?, ?)', (previous, last))
+
+        # Index perceptual hashes now, if they must be indexed
+        if indexed:
+            store.get_perceptual_hash(previous)
+            store.get_perceptual_hash(last)
+
+        return {
+            "name": f'delete_duplicated_image[{name}]',
+            "function": obj.delete_duplicated_image,
+            "setup": setup,
+            "items": 1,
+        }
+
+    megapixels = f'{large[0] * large[1] / 1e6:.0f} MP'
+    cases.append(duplicates_case('same content', original, original, True))
+    cases.append(duplicates_case('re-encoded, indexed', original, recompressed, True))
+    cases.append(duplicates_case('different, indexed', original, other, True))
+    cases.append(duplicates_case(f're-encoded, not indexed, {megapixels}', original, recompressed, False))
+    cases.append(duplicates_case(f'different, not indexed, {megapixels}', original, other, False))
+
+    return cases
+
+
+def measure(case, repeat):
+    """
+    Measure a case: latency of each call, then the peak of Python allocations during one call.
+    :param case: dict - returned by build_cases()
+    :param repeat: int - number of measured calls
+    :return: dict - 'median_ms', 'p95_ms', 'per_item_us' and 'peak_kb'
+    """
+
+    def call():
+        if case["setup"] is not None:
+            case["setup"]()
+        start = time.perf_counter()
+        case["function"]()
+        return time.perf_counter() - start
+
+    # Warm up
+    call()
+
+    durations = sorted(call() for _ in range(repeat))
+    median = statistics.median(durations)
+
+    if case["setup"] is not None:
+        case["setup"]()
+    tracemalloc.start()
+    case["function"]()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(median * 1000, 4),
+        "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 4),
+        "per_item_us": round(median * 1e6 / case["items"], 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, noise_ms):
+    """
+    Return cases whose median latency is slower than the baseline by more than the tolerance.
+    :param results: dict - measures by case name
+    :param baseline: dict - saved measures by case name
+    :param tolerance: float - allowed slowdown (ex: 0.25 for 25%)
+    :param noise_ms: float - slowdowns under this duration are ignored, as timer noise
+    :return: list - tuples (case name, baseline median, median)
+    """
+
+    regressions = []
+    for name, values in results.items():
+        if name not in baseline:
+            continue
+
+        before = baseline[name]["median_ms"]
+        if values["median_ms"] > before * (1 + tolerance) and values["median_ms"] - before > noise_ms:
+            regressions.append((name, baseline[name]["median_ms"], values["median_ms"]))
+
+    return regressions
+
+
+def main():
+    """
+    Parse arguments, generate fixtures, and run benchmarks.
+    :return: void
+    """
+
+    parser = argparse.ArgumentParser(description='Microbenchmarks of CPU-side hot paths, on generated fixtures.')
+    parser.add_argument('--contacts', type=int, default=10000, help='contacts of the People API payload')
+    parser.add_argument('--users', type=int, default=1000, help='users in the history table')
+    parser.add_argument('--history', type=int, default=200, help='entries of each user history')
+    parser.add_argument('--large-width', type=int, default=4000, help='width of large JPEGs (4:3)')
+    parser.add_argument('--repeat', type=int, default=30, help='measured calls of each case')
+    parser.add_argument('--filter', help='only run cases whose name contains this text')
+    parser.add_argument('--save', help='write results to this file')
+    parser.add_argument('--compare', help='compare to results saved by --save, and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown with --compare')
+    parser.add_argument('--noise-ms', type=float, default=0.05, help='slowdowns ignored with --compare, in milliseconds')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='richgcontacts-micro-')
+    use_workdir(workdir)
+
+    print('Generating fixtures...', file=sys.stderr)
+    cases = [case for case in build_cases(args, workdir) if args.filter is None or args.filter in case["name"]]
+
+    results = {}
+    width = max(len(case["name"]) for case in cases)
+    print(f'{"case":<{width}}  {"median ms":>10}  {"p95 ms":>10}  {"µs/item":>10}  {"py peak KB":>10}')
+    for case in cases:
+        values = measure(case, args.repeat)
+        results[case["name"]] = values
+        print(f'{case["name"]:<{width}}  {values["median_ms"]:>10.3f}  {values["p95_ms"]:>10.3f}  {values["per_item_us"]:>10.2f}  {values["peak_kb"]:>10.1f}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance, args.noise_ms)
+
+        for name, before, after in regressions:
+            print(f'Regression: {name}: {before:.3f} ms -> {after:.3f} ms', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,36 @@
 # /!\ This file called by setup.py only /!\
 
+import argparse
+
 from richgcontacts.core import *
+from richgcontacts.daemon import SyncDaemon
 
 
 # Execute main function from setup.py
 def main_for_setup():
-    main()
+    parser = argparse.ArgumentParser(prog='richgcontacts')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only process contacts added or changed in Google since the last complete run')
+    parser.add_argument('--concurrent', action='store_true',
+                        help='overlap listing, downloads and uploads, with a concurrent pipeline')
+    parser.add_argument('--async', dest='asynchronous', action='store_true',
+                        help='download profile pictures with asyncio, many at a time')
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help='start from scratch, even if the last run has been interrupted')
+    parser.add_argument('--account', dest='accounts', action='append', metavar='NAME',
+                        help='synchronize this Google account (repeat it for several accounts, sharing profiles fetches)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running, and check each profile again when its refresh is due')
+    args = parser.parse_args()
+
+    # Keep running, until stopped (the daemon lists contacts incrementally by itself, for a single account)
+    if args.daemon:
+        if args.incremental or args.concurrent or args.asynchronous:
+            parser.error('--daemon can not be combined with --incremental, --concurrent or --async')
+        if args.accounts and len(args.accounts) > 1:
+            parser.error('--daemon synchronizes a single --account')
+
+        return SyncDaemon(account=args.accounts[0] if args.accounts else None).run()
+
+    main(incremental=args.incremental, concurrent=args.concurrent, asynchronous=args.asynchronous, resume=args.resume,
+         accounts=args.accounts)
@@ -1,18 +1,228 @@
 from __future__ import print_function
+import asyncio
 import os
 import colorama
 from datetime import datetime
-from PIL import Image
 
+from richgcontacts.fetch_cache import FetchCache
+from richgcontacts.globals import *
+from richgcontacts.metrics import Metrics
 from richgcontacts.people_api import PeopleApi
+from richgcontacts.pipeline import SyncPipeline
+from richgcontacts.run_journal import RunJournal
 from richgcontacts.social import Social
+from richgcontacts.upload_ledger import UploadLedger
 
 
-def main():
+def main(incremental=False, concurrent=False, workers=None, asynchronous=False, resume=True, accounts=None):
     """
     Try connecting the Google People API.
     Get user contacts.
     Try to update theirs profile pictures.
+    :param incremental: bool - only process contacts added or changed in Google since the last complete run
+    :param concurrent: bool - run the synchronization as a concurrent pipeline, instead of one contact at a time
+    :param workers: dict|None - number of workers by pipeline stage, overriding PIPELINE_WORKERS
+    :param asynchronous: bool - run the synchronization with asyncio (see main_async())
+    :param resume: bool - resume the last run if it has been interrupted, skipping fetches and uploads it has done
+    :param accounts: list|None - names of the Google accounts to synchronize, one after the other, sharing profile
+    pictures fetches (None for the default account only)
+    """
+
+    if asynchronous:
+        return asyncio.run(main_async(incremental=incremental, resume=resume, accounts=accounts))
+
+    print_header()
+
+    # Init colorama
+    colorama.init(wrap=True)
+
+    # Start measuring this run
+    metrics = Metrics.start_run()
+
+    # Start the journal of this run, or resume the interrupted one
+    journal = start_journal(resume)
+
+    # Fetch each profile only once, for all contacts of all accounts
+    FetchCache.start_run()
+
+    for account in accounts or [None]:
+        print_account(account)
+        journal.use_account(account)
+        sync_account(account, incremental, concurrent, workers)
+
+    # The run is complete: the next one starts from scratch
+    journal.finish()
+    FetchCache.end_run()
+
+    # Write metrics of this run
+    metrics.export()
+
+
+def sync_account(account, incremental=False, concurrent=False, workers=None):
+    """
+    Synchronize contacts of a Google account.
+    :param account: string|None - name of the Google account, None for the default one
+    :param incremental: bool - only process contacts added or changed in Google since the last complete run
+    :param concurrent: bool - run the synchronization as a concurrent pipeline, instead of one contact at a time
+    :param workers: dict|None - number of workers by pipeline stage, overriding PIPELINE_WORKERS
+    :return: list - updated users, returned by report_updates()
+    """
+
+    # Init API object
+    api = PeopleApi(account)
+    api.on_update = journal_update
+
+    # Load photos uploaded by previous runs
+    ledger = UploadLedger(api.upload_ledger_path)
+
+    # Get contacts (pages are fetched while contacts are processed)
+    connections = api.get_contacts(person_fields='names,photos,imClients,birthdays', incremental=incremental)
+
+    if concurrent:
+
+        # Overlap listing, downloads, scoring and uploads
+        pipeline = SyncPipeline(filter_contacts, fetch_network_picture, choose_contact_image,
+                                lambda user, choosen_image_path, fetched: queue_contact_update(api, ledger, user, choosen_image_path, get_contact_birthday(user, fetched)),
+                                on_contact=print_contact, workers=workers)
+        queued_users = pipeline.run(connections)
+
+    else:
+        queued_users = []
+
+        # Filter, for get only users to manage, and format data
+        for user in filter_contacts(connections):
+
+            # Get profile picture on each social networks
+            fetched = [fetch_network_picture(network) for network in user["networks"]]
+            print_contact(user, fetched)
+
+            # Get the best image to use
+            choosen_image_path = choose_contact_image(user, fetched)
+
+            # Try to update contact profile picture and birthday
+            queued_user = queue_contact_update(api, ledger, user, choosen_image_path, get_contact_birthday(user, fetched))
+            if queued_user is not None:
+                queued_users.append(queued_user)
+
+    return report_updates(api, ledger, queued_users)
+
+
+async def main_async(incremental=False, concurrency=ASYNC_DOWNLOAD_CONCURRENCY, resume=True, accounts=None):
+    """
+    Asynchronous variant of main().
+    Contacts are processed as soon as they are listed, with up to 'concurrency' profile pictures downloads in flight.
+    Lookups on each social network are limited by PIPELINE_WORKERS, for networks driven by a single browser or session.
+    :param incremental: bool - only process contacts added or changed in Google since the last complete run
+    :param concurrency: int - maximum number of downloads (and contacts) in flight
+    :param resume: bool - resume the last run if it has been interrupted, skipping fetches and uploads it has done
+    :param accounts: list|None - names of the Google accounts to synchronize, one after the other, sharing profile
+    pictures fetches (None for the default account only)
+    """
+
+    print_header()
+
+    # Init colorama
+    colorama.init(wrap=True)
+
+    # Start measuring this run
+    metrics = Metrics.start_run()
+
+    # Start the journal of this run, or resume the interrupted one
+    journal = start_journal(resume)
+
+    # Fetch each profile only once, for all contacts of all accounts
+    FetchCache.start_run()
+
+    for account in accounts or [None]:
+        print_account(account)
+        journal.use_account(account)
+        await sync_account_async(account, incremental, concurrency)
+
+    # The run is complete: the next one starts from scratch
+    journal.finish()
+    FetchCache.end_run()
+
+    # Write metrics of this run
+    metrics.export()
+
+
+async def sync_account_async(account, incremental=False, concurrency=ASYNC_DOWNLOAD_CONCURRENCY):
+    """
+    Asynchronous variant of sync_account().
+    :param account: string|None - name of the Google account, None for the default one
+    :param incremental: bool - only process contacts added or changed in Google since the last complete run
+    :param concurrency: int - maximum number of downloads (and contacts) in flight
+    :return: list - updated users, returned by report_updates()
+    """
+
+    loop = asyncio.get_running_loop()
+    executor = Social.get_executor()
+
+    # Init API object
+    api = await loop.run_in_executor(executor, PeopleApi, account)
+    api.on_update = journal_update
+
+    # Load photos uploaded by previous runs
+    ledger = UploadLedger(api.upload_ledger_path)
+
+    # Get contacts (pages are fetched while contacts are processed)
+    connections = api.get_contacts(person_fields='names,photos,imClients,birthdays', incremental=incremental)
+    users = filter_contacts(connections)
+
+    # Prepare limits
+    downloads = asyncio.Semaphore(concurrency)
+    contacts = asyncio.Semaphore(concurrency)
+    lookups = {name: asyncio.Semaphore(count) for name, count in PIPELINE_WORKERS.items() if Social.is_managed(name)}
+
+    tasks = []
+    while True:
+
+        # Get next user, without blocking the event loop during API calls
+        user = await loop.run_in_executor(executor, next, users, None)
+        if user is None:
+            break
+
+        # Process the user in its own task
+        await contacts.acquire()
+        task = asyncio.create_task(process_contact_async(api, ledger, user, downloads, lookups))
+        task.add_done_callback(lambda _: contacts.release())
+        tasks.append(task)
+
+    # Keep results in listing order
+    queued_users = [result for result in await asyncio.gather(*tasks) if result is not None]
+
+    return await loop.run_in_executor(executor, report_updates, api, ledger, queued_users)
+
+
+async def process_contact_async(api, ledger, user, downloads, lookups):
+    """
+    Get profile pictures of a user on all its networks concurrently, then choose and queue the best one, with the
+    birthday found on networks.
+    :param api: PeopleApi
+    :param ledger: UploadLedger
+    :param user: dict - returned by filter_contacts()
+    :param downloads: asyncio.Semaphore - limit the number of downloads in flight
+    :param lookups: dict - asyncio.Semaphore for each social network, to limit its concurrent lookups
+    :return: dict|None - data to keep for the report, or None if there is nothing to update
+    """
+
+    loop = asyncio.get_running_loop()
+    executor = Social.get_executor()
+
+    # Get profile picture on each social networks
+    fetched = await asyncio.gather(*[fetch_network_picture_async(network, downloads, lookups) for network in user["networks"]])
+    print_contact(user, fetched)
+
+    # Get the best image to use
+    choosen_image_path = await loop.run_in_executor(executor, choose_contact_image, user, fetched)
+
+    return await loop.run_in_executor(executor, queue_contact_update, api, ledger, user, choosen_image_path, get_contact_birthday(user, fetched))
+
+
+def print_header():
+    """
+    Show the execution header.
+    :return: void
     """
 
     print('\n')
@@ -21,79 +231,166 @@ def main():
     print('-' * 15)
     print('\n')
 
-    # Init colorama
-    colorama.init(wrap=True)
 
-    # Init API object
-    api = PeopleApi()
+def print_account(account):
+    """
+    Show the Google account whose contacts are synchronized next.
+    :param account: string|None - account name, None for the default one
+    :return: void
+    """
 
-    # Get contacts
-    connections = api.get_contacts()
+    if account is not None:
+        print(f'\u001b[36mAccount "{account}"\u001b[0m\n')
 
-    # Filter, for get only users to manage, and format data
-    users = filter_contacts(connections)
 
-    # Prepare array of returned data
-    updated_users = []
+def start_journal(resume=True):
+    """
+    Start the journal of a run, resuming the interrupted run if there is one.
+    :param resume: bool - resume the last run if it has been interrupted, else start from scratch
+    :return: RunJournal
+    """
+
+    journal = RunJournal.start_run(max_age=RUN_JOURNAL_MAX_AGE if resume else 0)
+
+    if journal.resumed_from is not None:
+        started_at = datetime.fromtimestamp(journal.resumed_from).strftime('%Y-%m-%d %H:%M')
+        print(f'\u001b[33mResuming the run interrupted since {started_at}: {len(journal.entries)} contacts already processed.\u001b[0m\n')
+
+    return journal
+
 
-    for user in users:
+def journal_update(resource_name, kind, success):
+    """
+    Journal a sent photo update, as soon as its batch is answered (called by PeopleApi).
+    :param resource_name: string - updated contact
+    :param kind: string - updated data, 'fields' or 'photo'
+    :param success: bool
+    :return: void
+    """
 
-        print(f'Contact "{user["display_name"]}"')
+    journal = RunJournal.get_current()
 
-        images_path = []
+    # Updated fields are in the next listing: only photos need to be journaled
+    if journal is not None and kind == 'photo':
+        journal.complete(resource_name, 'photo', success)
 
-        # Loop on each social networks
-        for network in user["networks"]:
 
-            # At first, check if this social network is managed
-            is_managed = Social.is_managed(network["network_name"])
+def queue_contact_update(api, ledger, user, choosen_image_path, birthday=None):
+    """
+    Queue contact profile picture and birthday updates (sent by batches, in the same flush for a contact).
+    The picture update is skipped if this image is already the contact photo, according to the upload ledger.
+    :param api: PeopleApi
+    :param ledger: UploadLedger
+    :param user: dict - returned by filter_contacts()
+    :param choosen_image_path: dict|None - returned by choose_best_image(), or None if there is no image
+    :param birthday: dict|None - returned by get_contact_birthday(), or None if the birthday is unchanged
+    :return: dict|None - data to keep for the report, or None if there is nothing to update
+    """
 
-            # Show network name and username
-            print(f'    {network["network_name"]} : {network["user_name"]}', end="")
+    queued_user = {
+        "resource_name": user["resource_name"],
+        "choosen_network": None,
+        "digest": None,
+        "birthday": None,
+    }
 
-            # At first, check if this social network is managed
-            if not is_managed:
-                print('  \u001b[31m(not managed)\u001b[0m')
-                continue
+    # Queue the birthday first: it's sent with the contact etag, before the photo update which changes it
+    if birthday is not None:
+        api.queue_contact_fields(user["resource_name"], user["etag"], {"birthdays": [{"date": birthday}]})
+        queued_user["birthday"] = birthday
 
-            # Else, instantiate social network object
-            obj = Social(network["network_name"], network["user_name"])
+    if choosen_image_path is not None:
+        digest = Social.get_store().get_digest(choosen_image_path["image_path"])
+        journal = RunJournal.get_current()
+        uploaded = journal.get(user["resource_name"], 'photo') if journal is not None else None
 
-            # Get profile picture for this user
-            process = obj.download_profile_picture()
+        # Photo uploaded by the interrupted run: only remember it (the listing gives the etag after this upload)
+        if uploaded is not None and uploaded["digest"] == digest:
+            ledger.record(user["resource_name"], digest, user["etag"])
 
-            # Init colorama again, because some packages reset it
-            colorama.init()
+        # Skip contacts whose photo is unchanged since the last upload
+        elif not ledger.is_uploaded(user["resource_name"], digest, user["etag"]):
+            if journal is not None:
+                journal.queue(user["resource_name"], 'photo', {"digest": digest})
+            api.queue_contact_photo(choosen_image_path["image_path"], user["resource_name"], digest)
+            queued_user["choosen_network"] = choosen_image_path["network_name"]
+            queued_user["digest"] = digest
 
-            if process["success"] is False:
-                if process["error"] == "user_not_found":
-                    print(f"    \u001b[33mWarning: user '{network['user_name']}' was not found. Please check this user name.\u001b[0m")
-                elif process["error"] == "user_private":
-                    print(f"    \u001b[33mWarning: user '{network['user_name']}' is private.\u001b[0m")
-                else:
-                    print(f"    \u001b[31mError: {process['error']}\u001b[0m")
-            else:
-                print('   \u001b[32mOK\u001b[0m')
-                images_path.append({"network_name": network["network_name"], "image_path": process["image_path"]})
+    # Nothing to update for this user
+    if queued_user["digest"] is None and queued_user["birthday"] is None:
+        return None
 
-        # Try to update contact profile picture
-        if len(images_path):
+    return queued_user
 
-            # Get the best image to use
-            choosen_image_path = choose_best_image(images_path)
 
-            # Try to update contact profile picture
-            result = api.update_contact_photo(choosen_image_path["image_path"], user["resource_name"])
+def get_contact_birthday(user, fetched):
+    """
+    Return the birthday found on social networks, if the contact birthday must be updated with it: the contact has
+    no birthday, or the same date without year. A different birthday entered in Google (as a date, or as a free text)
+    is never overwritten.
+    :param user: dict - returned by filter_contacts()
+    :param fetched: list - returned by fetch_network_picture(), for each user network
+    :return: dict|None - People API date, with 'month', 'day' and optionally 'year', or None if there is nothing to update
+    """
+
+    found = [result["birthday"] for result in fetched if result.get("birthday")]
+    if not len(found):
+        return None
+
+    # Prefer complete dates
+    birthday = max(found, key=lambda date: "year" in date)
+
+    # No birthday entered in Google, neither as a date nor as a text
+    if not any(item.get("date") or item.get("text") for item in user["birthdays"]):
+        return birthday
+
+    for date in [item["date"] for item in user["birthdays"] if item.get("date")]:
+        if date.get("month") == birthday["month"] and date.get("day") == birthday["day"]:
 
-            if len(result):
-                updated_users.append(
-                    {
-                        "success": result["success"],
-                        "error": result["error"],
-                        "api_result": result["api_result"],
-                        "choosen_network": choosen_image_path["network_name"],
-                     }
-                )
+            # Complete the year, if it's missing
+            if not date.get("year") and "year" in birthday:
+                return birthday
+            return None
+
+    return None
+
+
+def report_updates(api, ledger, queued_users):
+    """
+    Send remaining queued updates, save the sync token and the upload ledger, and show updated contacts.
+    :param api: PeopleApi
+    :param ledger: UploadLedger
+    :param queued_users: list - returned by queue_contact_update(), in listing order
+    :return: list - updated users
+    """
+
+    # Send remaining queued updates, and get results by contact
+    results = api.flush_contact_updates()
+
+    updated_users = []
+    for user in queued_users:
+        result = results[user["resource_name"]]
+
+        # Remember uploaded photos, to skip them while they are unchanged
+        if result["success"]:
+            if user["digest"] is not None:
+                ledger.record(user["resource_name"], user["digest"], result["etag"])
+            else:
+                ledger.refresh(user["resource_name"], result["etag"])
+
+        updated_users.append(
+            {
+                "success": result["success"],
+                "error": result["error"],
+                "api_result": result["api_result"],
+                "choosen_network": user["choosen_network"],
+                "birthday": user["birthday"],
+             }
+        )
+
+    # All listed contacts have been processed: keep the sync token for the next incremental run
+    api.save_sync_token()
+    ledger.save()
 
     # TODO : better way to show updated users
     print('\n')
@@ -108,24 +405,245 @@ def main():
 
             # Check if picture has been correctly updated
             if user["success"]:
-                print(user["api_result"][0]["displayName"]+f'   \u001b[32mChoosen newtork data: {user["choosen_network"]}\u001b[0m')
+                updates = []
+                if user["choosen_network"] is not None:
+                    updates.append(f'Choosen newtork data: {user["choosen_network"]}')
+                if user["birthday"] is not None:
+                    updates.append(f'Birthday: {format_birthday(user["birthday"])}')
+                print(user["api_result"][0]["displayName"]+f'   \u001b[32m{"   ".join(updates)}\u001b[0m')
             else:
                 print(user["api_result"][0]["displayName"] + f'   \u001b[31mError: {user["error"]}\u001b[0m')
 
+    return updated_users
+
+
+def format_birthday(birthday):
+    """
+    Format a People API date, for the report.
+    :param birthday: dict - contain 'month', 'day' and optionally 'year'
+    :return: string - ex: '1990-03-25', or '--03-25' without year
+    """
+
+    year = f'{birthday["year"]:04d}' if birthday.get("year") else '-'
+
+    return f'{year}-{birthday["month"]:02d}-{birthday["day"]:02d}'
+
+
+def fetch_network_picture(network):
+    """
+    Get profile picture of a user, for a social network.
+    :param network: dict - contain 'network_name' and 'user_name'
+    :return: dict - contain 'image' (dict with 'network_name' and 'image_path', or None) and 'log' (line to print)
+    """
+
+    # At first, check if this social network is managed
+    if not Social.is_managed(network["network_name"]):
+        return format_network_result(network, None)
+
+    # Reuse the picture fetched by the interrupted run
+    result = get_journal_fetch(network)
+    if result is not None:
+        return result
+
+    # Reuse the picture fetched for another contact (or account) by this run
+    cache = FetchCache.get_current()
+    if cache is None:
+        return journal_fetch(network, download_network_picture(network))
+
+    result, cached = cache.get_or_fetch(network["network_name"], network["user_name"], lambda: download_network_picture(network))
+    if cached:
+        Metrics.get_current().count('fetch_cache_hits', network=network["network_name"])
+
+    return journal_fetch(network, result)
+
+
+def download_network_picture(network):
+    """
+    Look up and download the profile picture of a user, for a managed social network.
+    :param network: dict - contain 'network_name' and 'user_name'
+    :return: dict - returned by format_network_result()
+    """
+
+    with Metrics.get_current().span('fetch', network["network_name"], network.get("resource_name")) as span:
+
+        # Instantiate social network object
+        obj = Social(network["network_name"], network["user_name"])
+
+        # Get profile picture for this user
+        process = obj.download_profile_picture()
+        span["error"] = process["error"]
+
+    # Restore colorama streams, because some packages reset them (init() again would wrap them once more per contact)
+    colorama.reinit()
+
+    return format_network_result(network, process)
+
+
+async def fetch_network_picture_async(network, downloads, lookups):
+    """
+    Asynchronous variant of fetch_network_picture().
+    :param network: dict - contain 'network_name' and 'user_name'
+    :param downloads: asyncio.Semaphore - limit the number of downloads in flight
+    :param lookups: dict - asyncio.Semaphore for each social network, to limit its concurrent lookups
+    :return: dict - contain 'image' (dict with 'network_name' and 'image_path', or None) and 'log' (line to print)
+    """
+
+    # At first, check if this social network is managed
+    if not Social.is_managed(network["network_name"]):
+        return format_network_result(network, None)
+
+    # Reuse the picture fetched by the interrupted run
+    result = get_journal_fetch(network)
+    if result is not None:
+        return result
+
+    # Reuse the picture fetched for another contact (or account) by this run
+    cache = FetchCache.get_current()
+    if cache is None:
+        return journal_fetch(network, await download_network_picture_async(network, downloads, lookups))
+
+    result, cached = await cache.get_or_fetch_async(network["network_name"], network["user_name"], lambda: download_network_picture_async(network, downloads, lookups))
+    if cached:
+        Metrics.get_current().count('fetch_cache_hits', network=network["network_name"])
+
+    return journal_fetch(network, result)
+
+
+async def download_network_picture_async(network, downloads, lookups):
+    """
+    Asynchronous variant of download_network_picture().
+    :param network: dict - contain 'network_name' and 'user_name'
+    :param downloads: asyncio.Semaphore - limit the number of downloads in flight
+    :param lookups: dict - asyncio.Semaphore for each social network, to limit its concurrent lookups
+    :return: dict - returned by format_network_result()
+    """
+
+    loop = asyncio.get_running_loop()
+
+    with Metrics.get_current().span('fetch', network["network_name"], network.get("resource_name")) as span:
+
+        # Instantiate social network object (may wait for the user to log in)
+        async with lookups[network["network_name"]]:
+            obj = await loop.run_in_executor(Social.get_executor(), Social, network["network_name"], network["user_name"])
+
+        # Get profile picture for this user
+        process = await obj.download_profile_picture_async(downloads, lookups[network["network_name"]])
+        span["error"] = process["error"]
+
+    # Restore colorama streams, because some packages reset them (init() again would wrap them once more per contact)
+    colorama.reinit()
+
+    return format_network_result(network, process)
+
+
+def get_journal_fetch(network):
+    """
+    Return the result of a fetch done by the interrupted run, if its picture is still stored.
+    :param network: dict - contain 'network_name', 'user_name' and 'resource_name'
+    :return: dict|None - returned by format_network_result(), or None if this fetch must be done
+    """
+
+    journal = RunJournal.get_current()
+    if journal is None or network.get("resource_name") is None:
+        return None
+
+    result = journal.get(network["resource_name"], f'fetch:{network["network_name"]}:{network["user_name"]}')
+    if result is None or not os.path.exists(result["image"]["image_path"]):
+        return None
+
+    Metrics.get_current().count('resumed_fetches', network=network["network_name"])
+
+    # Other contacts (or accounts) using this profile reuse it too
+    cache = FetchCache.get_current()
+    if cache is not None:
+        cache.set(network["network_name"], network["user_name"], result)
+
+    return result
+
+
+def journal_fetch(network, result):
+    """
+    Journal the result of a fetch, if a picture has been found.
+    :param network: dict - contain 'network_name', 'user_name' and 'resource_name'
+    :param result: dict - returned by format_network_result()
+    :return: dict - result
+    """
+
+    journal = RunJournal.get_current()
+    if journal is not None and network.get("resource_name") is not None and result["image"] is not None:
+        journal.record(network["resource_name"], f'fetch:{network["network_name"]}:{network["user_name"]}', result)
+
+    return result
+
+
+def format_network_result(network, process):
+    """
+    Format the result of a profile picture download.
+    :param network: dict - contain 'network_name' and 'user_name'
+    :param process: dict|None - returned by Social.download_profile_picture(), or None if network is not managed
+    :return: dict - contain 'image' (dict with 'network_name' and 'image_path', or None), 'birthday' (dict or None)
+    and 'log' (line to print)
+    """
+
+    # Show network name and username
+    log = f'    {network["network_name"]} : {network["user_name"]}'
+
+    if process is None:
+        return {
+            "image": None,
+            "birthday": None,
+            "log": log + '  \u001b[31m(not managed)\u001b[0m',
+        }
+
+    if process["success"] is False:
+        if process["error"] == "user_not_found":
+            log += f"    \u001b[33mWarning: user '{network['user_name']}' was not found. Please check this user name.\u001b[0m"
+        elif process["error"] == "user_private":
+            log += f"    \u001b[33mWarning: user '{network['user_name']}' is private.\u001b[0m"
+        else:
+            log += f"    \u001b[31mError: {process['error']}\u001b[0m"
+
+        return {
+            "image": None,
+            "birthday": None,
+            "log": log,
+        }
+
+    return {
+        "image": {"network_name": network["network_name"], "image_path": process["image_path"], "image_date": process.get("image_date")},
+        "birthday": process.get("birthday"),
+        "log": log + '   \u001b[32mOK\u001b[0m',
+    }
+
+
+def print_contact(user, fetched):
+    """
+    Show a contact, and the result of each of its social networks.
+    :param user: dict - returned by filter_contacts()
+    :param fetched: list - returned by fetch_network_picture(), for each user network
+    :return: void
+    """
+
+    print(f'Contact "{user["display_name"]}"')
+
+    for result in fetched:
+        print(result["log"])
+
 
 def filter_contacts(connections):
     """
     Filter data returned by Google API 'connections' call, for get only wanted contacts
-    :param connections: Google People API object returned by connections().list()
-    :return: array
+    :param connections: iterable - contacts yielded by PeopleApi.get_contacts()
+    :return: generator - yield each formatted user
     """
 
-    # Prepare an array of users to return
-    formatted_users = []
-
     # Loop on each contact returned by API
     for person in connections:
 
+        # Ignore contacts deleted since the last incremental listing
+        if person.get('metadata', {}).get('deleted'):
+            continue
+
         # Get username
         name = person.get('names', [])
         if name:
@@ -145,32 +663,55 @@ def filter_contacts(connections):
                 networks.append({
                     "network_name": data["protocol"].lower().replace(' ', ''),
                     "user_name": data["username"],
+                    "resource_name": person["resourceName"],
                 })
 
             # Check if we need to push contact in array
             if len(networks):
 
-                # Append user data
-                formatted_users.append({
+                # Yield user data
+                yield {
                     "resource_name": person["resourceName"],
                     "etag": person["etag"],
                     "display_name": user_name,
                     "imClients": contact_imClients_data,
                     "photos": person.get('photos', []),
+                    "birthdays": person.get('birthdays', []),
                     "networks": networks,
-                })
+                }
 
-    # Return all formatted users
-    return formatted_users
 
+def choose_contact_image(user, fetched):
+    """
+    Choose the best image among images fetched for a contact.
+    :param user: dict - returned by filter_contacts()
+    :param fetched: list - returned by fetch_network_picture(), for each user network
+    :return: dict|None - returned by choose_best_image(), or None if no image has been fetched
+    """
+
+    images_path = [result["image"] for result in fetched if result["image"] is not None]
+    if not len(images_path):
+        return None
 
-def choose_best_image(image_objects):
+    with Metrics.get_current().span('choose', contact=user["resource_name"]):
+        return choose_best_image(images_path)
+
+
+def choose_best_image(image_objects, metadata_cache=None):
     """
     Define which is the best image to use
+    Images metadata come from the metadata cache, so images are not opened again.
     :param image_objects: list - list of dict, contain images to analyze
+    :param metadata_cache: ImageMetadataCache|None - cache to use, the image store one by default
     :return: string - path to chosen image
     """
 
+    if metadata_cache is None:
+        metadata_cache = Social.get_store().metadata
+
+    # Get metadata of each image, only one time
+    metadata = {image_info["image_path"]: metadata_cache.get(image_info["image_path"]) for image_info in image_objects}
+
     def get_resolution(path):
         """
         Define which is the best image to use
@@ -178,21 +719,19 @@ def choose_best_image(image_objects):
         :return: void - width, height
         """
 
-        # Open image with PIL
-        with Image.open(path) as img:
-            # Get image resolution
-            width, height = img.size
-        return width, height
+        return metadata[path]["width"], metadata[path]["height"]
 
-    def get_creation_date(path):
+    def get_creation_date(image_info):
         """
         Define which is the best image to use
-        :param path: string - path to chosen image
+        :param image_info: dict - contain 'image_path', and 'image_date' if known
         :return: string - timestamp
         """
 
-        # Uses the file's last modification date as the creation date
-        timestamp = os.path.getmtime(path)
+        # Uses the date the image was added to the user history, else the file's last modification date
+        timestamp = image_info.get("image_date")
+        if timestamp is None:
+            timestamp = metadata[image_info["image_path"]]["mtime"]
         return datetime.fromtimestamp(timestamp)
 
     def image_score(image_info):
@@ -205,9 +744,9 @@ def choose_best_image(image_objects):
         # Extract additional information about the image
         path = image_info["image_path"]
 
-        size = os.path.getsize(path)
+        size = metadata[path]["size"]
         resolution = get_resolution(path)
-        creation_date = get_creation_date(path)
+        creation_date = get_creation_date(image_info)
 
         # Score for image size (normalized)
         size_score = 1 - (size / MAX_SIZE)
@@ -243,9 +782,9 @@ def choose_best_image(image_objects):
         return total_score
 
     # Define maximum values for normalization (by getting max value of each dict in image_objects)
-    MAX_SIZE = max(os.path.getsize(image_info["image_path"]) for image_info in image_objects)
+    MAX_SIZE = max(metadata[image_info["image_path"]]["size"] for image_info in image_objects)
     MAX_RESOLUTION = max(get_resolution(image_info["image_path"]) for image_info in image_objects)
-    MAX_AGE_SECONDS = (datetime.now() - min(get_creation_date(image_info["image_path"]) for image_info in image_objects)).total_seconds()
+    MAX_AGE_SECONDS = (datetime.now() - min(get_creation_date(image_info) for image_info in image_objects)).total_seconds()
 
     # Define weights for each criterion (if a criteria is more important than another)
     is_from_instagram_weight = 1
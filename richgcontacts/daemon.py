@@ -0,0 +1,301 @@
+import signal
+import threading
+import time
+
+import colorama
+
+from richgcontacts.core import (choose_contact_image, fetch_network_picture, filter_contacts, get_contact_birthday,
+                                print_contact, print_header, queue_contact_update, report_updates)
+from richgcontacts.globals import *
+from richgcontacts.metrics import Metrics
+from richgcontacts.people_api import PeopleApi
+from richgcontacts.refresh_scheduler import RefreshScheduler
+from richgcontacts.social import Social
+from richgcontacts.upload_ledger import UploadLedger
+
+
+class SyncDaemon:
+    """
+    Long-running synchronization: instead of checking all profiles at each run, each social network profile is checked
+    when its refresh is due (see RefreshScheduler), and only contacts using a changed profile are updated, with new
+    and changed contacts (with the stored pictures of their profiles).
+    The API client, the upload ledger and social networks packages (ex: WhatsApp Web browser) are kept between checks.
+    Contacts are listed again incrementally every DAEMON_LIST_INTERVAL seconds, and after updates (to get new etags).
+
+    Attributes
+    ----------
+    api : PeopleApi
+        Google People API client
+    ledger : UploadLedger
+        photos uploaded to contacts
+    scheduler : RefreshScheduler
+        next check of each profile
+    users : dict
+        contacts using a managed social network, returned by filter_contacts(), by resource name
+    profiles : dict
+        resource names of contacts using each profile, by (network_name, user_name)
+    waiting : dict
+        contacts to update (new, changed, or using a changed profile) once all their profiles have been checked a first
+        time, by resource name, with results of their checked profiles, by (network_name, user_name)
+    next_listing : float
+        timestamp of the next contacts listing
+    is_listed : bool
+        True once a full listing has succeeded (next listings are incremental)
+    stop_event : threading.Event
+        set to stop the daemon
+
+    Methods
+    -------
+    run()
+        Check due profiles, until the daemon is stopped.
+    stop()
+        Stop the daemon, after the current check.
+    list_contacts(incremental)
+        List contacts, and schedule profiles of new contacts.
+    add_user(user)
+        Add or replace a contact, schedule its profiles, and mark it to update if it's new or changed.
+    remove_user(resource_name)
+        Remove a contact.
+    unlink_profiles(user)
+        Remove a contact from contacts using its profiles.
+    refresh_profiles(profiles)
+        Check profiles, and update contacts using changed ones.
+    update_waiting()
+        Update waiting contacts whose profiles have all been checked.
+    get_stored_result(network)
+        Return the last stored picture of a profile, as returned by fetch_network_picture().
+    """
+
+    def __init__(self, account=None):
+        """
+        Connect the Google People API, and load the upload ledger.
+        :param account: string|None - name of the Google account to synchronize (see PeopleApi), None for the default one
+        """
+
+        self.api = PeopleApi(account)
+        self.ledger = UploadLedger(self.api.upload_ledger_path)
+        self.scheduler = RefreshScheduler()
+        self.users = {}
+        self.profiles = {}
+        self.waiting = {}
+        self.next_listing = 0
+        self.is_listed = False
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """
+        Check due profiles, until the daemon is stopped (SIGINT or SIGTERM).
+        :return: void
+        """
+
+        print_header()
+
+        # Init colorama
+        colorama.init(wrap=True)
+
+        # Stop after the current check, on Ctrl+C or on service stop
+        for signal_number in [signal.SIGINT, signal.SIGTERM]:
+            signal.signal(signal_number, lambda *args: self.stop())
+
+        while not self.stop_event.is_set():
+
+            # Get contacts changes (a full listing first, to know all contacts)
+            if time.time() >= self.next_listing:
+                self.list_contacts(incremental=self.is_listed)
+
+            # Check a batch of due profiles (profiles are only known once contacts have been listed)
+            due = self.scheduler.get_due(limit=DAEMON_BATCH_SIZE) if self.is_listed else []
+            if len(due):
+                self.refresh_profiles(due)
+                continue
+
+            # Sleep until the next due check or listing
+            next_check = self.scheduler.get_next_time() if self.is_listed else None
+            next_time = min(t for t in [next_check, self.next_listing] if t is not None)
+            self.stop_event.wait(min(max(next_time - time.time(), 0), DAEMON_MAX_SLEEP))
+
+        print('\nDaemon stopped.')
+
+    def stop(self):
+        """
+        Stop the daemon, after the current check.
+        :return: void
+        """
+
+        self.stop_event.set()
+
+    def list_contacts(self, incremental=True):
+        """
+        List contacts, schedule profiles of new contacts, and update new and changed contacts whose profiles are
+        already checked (ex: after a restart). Deleted contacts, and contacts without social network anymore, are
+        removed.
+        If the listing fails (ex: temporary API error), the error is shown and the listing is retried later, without
+        stopping the daemon.
+        :param incremental: bool - only get contacts changed since the last listing
+        :return: void
+        """
+
+        try:
+            for person in self.api.get_contacts(person_fields='names,photos,imClients,birthdays', incremental=incremental, exit_on_error=False):
+
+                # Keep contacts using social networks (deleted contacts are filtered)
+                users = list(filter_contacts([person]))
+                if not len(users):
+                    self.remove_user(person["resourceName"])
+
+                for user in users:
+                    self.add_user(user)
+
+        except Exception as err:
+            print(f'\u001b[31mError on listing contacts, retrying in {DAEMON_LIST_RETRY_INTERVAL} seconds: {err}\u001b[0m')
+            self.next_listing = time.time() + DAEMON_LIST_RETRY_INTERVAL
+            return
+
+        self.api.save_sync_token()
+        self.is_listed = True
+        self.next_listing = time.time() + DAEMON_LIST_INTERVAL
+
+        # Update new and changed contacts whose profiles are already checked
+        metrics = Metrics.start_run()
+        self.update_waiting()
+        metrics.export()
+
+    def add_user(self, user):
+        """
+        Add or replace a contact, and schedule its profiles.
+        A new or changed contact is marked to update: with the stored pictures of its profiles if they have all been
+        checked, else after their first check. Its photo is uploaded only if it's not already uploaded (see
+        UploadLedger).
+        :param user: dict - returned by filter_contacts()
+        :return: void
+        """
+
+        previous = self.users.get(user["resource_name"])
+        if previous is not None:
+            self.unlink_profiles(previous)
+
+        self.users[user["resource_name"]] = user
+
+        # Keep results of profiles already checked for this contact, if it was waiting
+        if previous != user:
+            self.waiting.setdefault(user["resource_name"], {})
+
+        for network in user["networks"]:
+            if Social.is_managed(network["network_name"]):
+                self.profiles.setdefault((network["network_name"], network["user_name"]), set()).add(user["resource_name"])
+                self.scheduler.add(network["network_name"], network["user_name"])
+
+    def remove_user(self, resource_name):
+        """
+        Remove a contact. Its profiles stay scheduled, until they are due and no contact uses them.
+        :param resource_name: string
+        :return: void
+        """
+
+        self.waiting.pop(resource_name, None)
+
+        user = self.users.pop(resource_name, None)
+        if user is not None:
+            self.unlink_profiles(user)
+
+    def unlink_profiles(self, user):
+        """
+        Remove a contact from contacts using its profiles.
+        :param user: dict - returned by filter_contacts()
+        :return: void
+        """
+
+        for network in user["networks"]:
+            self.profiles.get((network["network_name"], network["user_name"]), set()).discard(user["resource_name"])
+
+    def refresh_profiles(self, profiles):
+        """
+        Check profiles, schedule their next check, and update contacts using changed ones (new picture, or birthday).
+        :param profiles: list - tuples (network_name, user_name)
+        :return: void
+        """
+
+        metrics = Metrics.start_run()
+        store = Social.get_store()
+
+        for network_name, user_name in profiles:
+            resource_names = sorted(self.profiles.get((network_name, user_name), []))
+
+            # Forget profiles not used by a contact anymore
+            if not len(resource_names):
+                self.scheduler.delete(network_name, user_name)
+                continue
+
+            network = {"network_name": network_name, "user_name": user_name, "resource_name": resource_names[0]}
+
+            # Check the profile
+            before = store.get_last(network_name, user_name)
+            result = fetch_network_picture(network)
+            after = store.get_last(network_name, user_name)
+            self.scheduler.record_check(network_name, user_name)
+
+            # Contacts to update: all contacts using this profile if it has changed, else only waiting contacts
+            is_changed = after is not None and (before is None or after["digest"] != before["digest"])
+            for resource_name in resource_names:
+                if is_changed or result["birthday"] or resource_name in self.waiting:
+                    self.waiting.setdefault(resource_name, {})[(network_name, user_name)] = result
+
+        self.update_waiting()
+
+        metrics.export()
+
+    def update_waiting(self):
+        """
+        Update waiting contacts whose profiles have all been checked a first time (so a contact is uploaded once): the
+        best picture is chosen again, among results of profiles checked since it waits, and stored pictures of others.
+        :return: void
+        """
+
+        queued_users = []
+
+        for resource_name in list(self.waiting):
+            user = self.users[resource_name]
+
+            # Wait for the first check of its other profiles
+            if not all(self.scheduler.is_checked(item["network_name"], item["user_name"]) for item in user["networks"] if Social.is_managed(item["network_name"])):
+                continue
+
+            results = self.waiting.pop(resource_name)
+            fetched = [results.get((item["network_name"], item["user_name"])) or self.get_stored_result(item) for item in user["networks"]]
+            print_contact(user, fetched)
+
+            queued_user = queue_contact_update(self.api, self.ledger, user, choose_contact_image(user, fetched), get_contact_birthday(user, fetched))
+            if queued_user is not None:
+                queued_users.append(queued_user)
+
+        if len(queued_users):
+            report_updates(self.api, self.ledger, queued_users)
+
+            # Get new etags of updated contacts
+            self.next_listing = 0
+
+    def get_stored_result(self, network):
+        """
+        Return the last stored picture of a profile, as returned by fetch_network_picture(), without checking it. The
+        birthday comes from the profile lookups cache, if it's still valid.
+        :param network: dict - contain 'network_name' and 'user_name'
+        :return: dict - contain 'image' (dict with 'network_name' and 'image_path', or None), 'birthday' and 'log'
+        """
+
+        log = f'    {network["network_name"]} : {network["user_name"]}'
+
+        last = Social.get_store().get_last(network["network_name"], network["user_name"]) if Social.is_managed(network["network_name"]) else None
+        if last is None:
+            return {
+                "image": None,
+                "birthday": None,
+                "log": log + '  (not checked yet)',
+            }
+
+        lookup = Social.get_profile_cache().get(network["network_name"], network["user_name"])
+
+        return {
+            "image": {"network_name": network["network_name"], "image_path": last["image_path"], "image_date": last["date"]},
+            "birthday": lookup["birthday"] if lookup is not None else None,
+            "log": log + '   (stored)',
+        }
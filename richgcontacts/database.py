@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+
+from richgcontacts.globals import *
+
+
+class Database:
+    """
+    SQLite database, in the userdata folder, used by persistent indexes.
+    A single connection is shared by all threads, and protected by a lock.
+
+    Attributes
+    ----------
+    path : string
+        path to the database file
+    connection : sqlite3.Connection
+        connection to the database, in autocommit mode
+    lock : threading.RLock
+        protect the connection, when it is used by several threads
+
+    Methods
+    -------
+    get(path)
+        Return the database instance for a path, creating it only one time.
+    create_tables(script)
+        Create tables and indexes, if they don't exist yet.
+    execute(query, params)
+        Execute a query, and return fetched rows.
+    execute_many(query, params_list)
+        Execute a query for each parameters tuple.
+    """
+
+    # Instantiated databases, by path
+    INSTANCES = {}
+    INSTANCES_LOCK = threading.Lock()
+
+    def __init__(self, path=None):
+        """
+        Open the database, creating the file if necessary.
+        :param path: string|None - path to the database file, 'index.db' in userdata folder by default
+        """
+
+        self.path = path or os.path.join(userdata_path, 'index.db')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+
+        # Allow reads while another process writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+    @classmethod
+    def get(cls, path=None):
+        """
+        Return the database instance for a path, creating it only one time.
+        :param path: string|None - path to the database file, 'index.db' in userdata folder by default
+        :return: Database
+        """
+
+        path = path or os.path.join(userdata_path, 'index.db')
+
+        with cls.INSTANCES_LOCK:
+            if path not in cls.INSTANCES:
+                cls.INSTANCES[path] = cls(path)
+
+        return cls.INSTANCES[path]
+
+    def create_tables(self, script):
+        """
+        Create tables and indexes, if they don't exist yet.
+        :param script: string - SQL statements, using 'IF NOT EXISTS'
+        :return: void
+        """
+
+        with self.lock:
+            self.connection.executescript(script)
+
+    def execute(self, query, params=()):
+        """
+        Execute a query, and return fetched rows.
+        :param query: string - SQL query
+        :param params: tuple|dict - query parameters
+        :return: list - sqlite3.Row objects
+        """
+
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def execute_many(self, query, params_list):
+        """
+        Execute a query for each parameters tuple, in a single transaction.
+        :param query: string - SQL query
+        :param params_list: iterable - parameters of each execution
+        :return: void
+        """
+
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(query, params_list)
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+
+class FetchCache:
+    """
+    Results of profile picture fetches done by a run, by (network name, user name).
+    A profile used by several contacts, or by several Google accounts synchronized by the same run, is fetched only
+    once: next contacts get the same result. Concurrent fetches of the same profile wait for the first one.
+
+    Attributes
+    ----------
+    results : dict
+        result of each fetched profile, returned by format_network_result(), by (network name, user name)
+    locks : dict
+        lock of each profile, held during its fetch
+    async_locks : dict
+        asyncio lock of each profile, held during its asynchronous fetch
+    lock : threading.Lock
+        protect results and locks, when contacts are processed concurrently
+
+    Methods
+    -------
+    start_run()
+        Start the cache of a new run, used by all modules until the next run.
+    end_run()
+        Forget the cache of the current run, once it has finished.
+    get_current()
+        Return the cache of the current run.
+    get(network_name, user_name)
+        Return the result of a profile fetch, if it has been done by this run.
+    set(network_name, user_name, result)
+        Keep the result of a profile fetch.
+    get_or_fetch(network_name, user_name, fetch)
+        Return the result of a profile fetch, fetching it only if it has not been done by this run.
+    get_or_fetch_async(network_name, user_name, fetch)
+        Asynchronous variant of get_or_fetch().
+    """
+
+    # Cache of the current run (replaced on each run, None outside of runs)
+    CURRENT = None
+    CURRENT_LOCK = threading.Lock()
+
+    def __init__(self):
+        """
+        Init an empty cache.
+        """
+
+        self.results = {}
+        self.locks = {}
+        self.async_locks = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def start_run(cls):
+        """
+        Start the cache of a new run, used by all modules until the next run.
+        :return: FetchCache
+        """
+
+        with cls.CURRENT_LOCK:
+            cls.CURRENT = cls()
+
+        return cls.CURRENT
+
+    @classmethod
+    def end_run(cls):
+        """
+        Forget the cache of the current run, once it has finished: next checks (ex: in daemon mode) fetch profiles again.
+        :return: void
+        """
+
+        with cls.CURRENT_LOCK:
+            cls.CURRENT = None
+
+    @classmethod
+    def get_current(cls):
+        """
+        Return the cache of the current run.
+        :return: FetchCache|None - None outside of runs (ex: daemon mode, where profiles are checked again)
+        """
+
+        return cls.CURRENT
+
+    def get(self, network_name, user_name):
+        """
+        Return the result of a profile fetch, if it has been done by this run.
+        :param network_name: string
+        :param user_name: string
+        :return: dict|None - returned by format_network_result(), or None if the profile has not been fetched
+        """
+
+        with self.lock:
+            return self.results.get((network_name, user_name))
+
+    def set(self, network_name, user_name, result):
+        """
+        Keep the result of a profile fetch.
+        :param network_name: string
+        :param user_name: string
+        :param result: dict - returned by format_network_result()
+        :return: void
+        """
+
+        with self.lock:
+            self.results[(network_name, user_name)] = result
+
+    def get_or_fetch(self, network_name, user_name, fetch):
+        """
+        Return the result of a profile fetch, fetching it only if it has not been done by this run. If the profile is
+        being fetched by another thread, wait for its result.
+        :param network_name: string
+        :param user_name: string
+        :param fetch: function - called without argument, return the result of the fetch
+        :return: tuple - result of the fetch, and True if it comes from the cache
+        """
+
+        with self.lock:
+            lock = self.locks.setdefault((network_name, user_name), threading.Lock())
+
+        with lock:
+            result = self.get(network_name, user_name)
+            if result is not None:
+                return result, True
+
+            result = fetch()
+            self.set(network_name, user_name, result)
+
+            return result, False
+
+    async def get_or_fetch_async(self, network_name, user_name, fetch):
+        """
+        Asynchronous variant of get_or_fetch(): if the profile is being fetched by another task, wait for its result.
+        :param network_name: string
+        :param user_name: string
+        :param fetch: function - called without argument, return an awaitable of the result of the fetch
+        :return: tuple - result of the fetch, and True if it comes from the cache
+        """
+
+        with self.lock:
+            lock = self.async_locks.setdefault((network_name, user_name), asyncio.Lock())
+
+        async with lock:
+            result = self.get(network_name, user_name)
+            if result is not None:
+                return result, True
+
+            result = await fetch()
+            self.set(network_name, user_name, result)
+
+            return result, False
@@ -3,3 +3,94 @@ import os
 # Set global variables
 root = os.path.abspath(os.path.dirname(__file__))
 userdata_path = os.path.join(root, f'userdata/')
+
+# Concurrent synchronization pipeline: number of workers for each stage, and for each social network fetch stage
+# Networks driven by a single browser or session must keep only one worker
+PIPELINE_WORKERS = {
+    "filter": 1,
+    "choose": 2,
+    "upload": 1,
+    "instagram": 1,
+    "facebook": 4,
+    "whatsapp": 1,
+}
+
+# Concurrent synchronization pipeline: maximum number of items waiting between two stages
+PIPELINE_QUEUE_SIZE = 100
+
+# Asynchronous synchronization: maximum number of profile pictures downloads in flight
+ASYNC_DOWNLOAD_CONCURRENCY = 200
+
+# Size of chunks written to disk, when downloading a profile picture
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of different bits between the perceptual hashes of two images, to consider them as the same picture
+# (ex: the same picture served with another compression level). Values lower than 4 use the index bands, and are faster
+PERCEPTUAL_HASH_THRESHOLD = 3
+
+# Shared HTTP client: number of hosts whose connection pool is kept, and maximum number of connections kept per host
+HTTP_POOL_CONNECTIONS = 16
+HTTP_POOL_MAXSIZE = 50
+
+# Shared HTTP client: default (connect, read) timeout in seconds, and retries with backoff on 5xx and connection resets
+HTTP_TIMEOUT = (5, 30)
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+
+# Social profile lookups cache: time to live of a resolved profile picture URL in seconds, for each network (0 to disable)
+# Within it, the profile lookup is skipped, and only the picture is revalidated (signed CDN URLs expire after some days)
+PROFILE_CACHE_TTL = {
+    "instagram": 24 * 3600,
+    "facebook": 24 * 3600,
+    "whatsapp": 6 * 3600,
+}
+
+# Social networks rate limits: profile lookups per second and burst size, for each network (rate None for no limit)
+RATE_LIMITS = {
+    "instagram": {"rate": 0.2, "burst": 3},
+    "facebook": {"rate": 1.0, "burst": 5},
+    "whatsapp": {"rate": None, "burst": 1},
+}
+
+# Social networks rate limits: retries of a rate limited lookup, and pause of the network before them in seconds
+# (doubled on each retry, up to the maximum)
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 30
+RATE_LIMIT_MAX_BACKOFF = 600
+
+# WhatsApp Web: maximum waiting time for a page element in seconds, for a search result in seconds (a contact not found
+# costs this time for each attempt), and number of search attempts for each contact
+WHATSAPP_WAIT_TIMEOUT = 10
+WHATSAPP_SEARCH_TIMEOUT = 5
+WHATSAPP_MAX_ATTEMPTS = 2
+
+# WhatsApp Web: open Chrome without window when the saved session is still logged in, maximum waiting time for
+# WhatsApp Web to load in seconds, and for the user to scan the QR code when the session is logged out
+WHATSAPP_HEADLESS = True
+WHATSAPP_LOAD_TIMEOUT = 60
+WHATSAPP_LOGIN_TIMEOUT = 300
+
+# Contact photos upload: images are cropped to a square, downsized to this maximum size in pixels, and re-encoded as
+# JPEG with this quality (Google downsizes contact photos anyway)
+UPLOAD_PHOTO_MAX_SIZE = 720
+UPLOAD_PHOTO_QUALITY = 85
+
+# Run journal: an interrupted run is resumed by the next one (completed fetches and photo uploads are not done again),
+# if it has started less than this time ago, in seconds (0 to never resume)
+RUN_JOURNAL_MAX_AGE = 24 * 60 * 60
+
+# Daemon mode: time between two incremental listings of contacts in seconds (and before retrying a failed one),
+# maximum number of profiles refreshed at a time, and maximum sleeping time between two schedule checks in seconds
+DAEMON_LIST_INTERVAL = 60 * 60
+DAEMON_LIST_RETRY_INTERVAL = 5 * 60
+DAEMON_BATCH_SIZE = 20
+DAEMON_MAX_SLEEP = 60
+
+# Daemon mode: each profile is checked again after a part (factor) of the mean time between its picture changes,
+# between a minimum and a maximum interval in seconds, with a random variation (jitter). First checks of profiles are
+# spread over a time window in seconds
+REFRESH_MIN_INTERVAL = 6 * 60 * 60
+REFRESH_MAX_INTERVAL = 30 * 24 * 60 * 60
+REFRESH_INTERVAL_FACTOR = 0.5
+REFRESH_JITTER = 0.1
+REFRESH_FIRST_SPREAD = 60 * 60
@@ -0,0 +1,163 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from richgcontacts.globals import *
+
+
+class HttpClient:
+    """
+    HTTP client shared by all social network adapters.
+    It keeps a pool of keep-alive connections for each host, so pictures served by the same CDN hosts don't pay a new
+    TCP and TLS handshake each time. Requests have a default timeout, and are retried with an exponential backoff on
+    server errors (5xx) and connection resets.
+
+    Attributes
+    ----------
+    session : requests.Session
+        session using the pooled adapter
+    adapter : requests.adapters.HTTPAdapter
+        adapter holding connection pools and retry policy, also mounted on sessions of external packages
+    pool_maxsize : int
+        maximum number of kept connections, for each host
+    timeout : tuple
+        default (connect, read) timeout, in seconds
+    stats : dict
+        requests count, retries count and errors count, by host
+    lock : threading.Lock
+        protect stats, when requests are sent concurrently
+
+    Methods
+    -------
+    get_shared()
+        Return the client shared by all adapters, creating it only one time.
+    get(url, **kwargs)
+        Send a GET request, with the pooled session.
+    mount(session)
+        Use the pooled adapter on another session (ex: session of an external package).
+    get_stats()
+        Return requests statistics, and connection pools statistics, by host.
+    """
+
+    # Client shared by all adapters (instantiated only one time)
+    SHARED = None
+    SHARED_LOCK = threading.Lock()
+
+    # Status codes retried with backoff
+    RETRY_STATUSES = [500, 502, 503, 504]
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, timeout=HTTP_TIMEOUT,
+                 retries=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR):
+        """
+        Init the pooled session.
+        :param pool_connections: int - number of hosts whose connection pool is kept
+        :param pool_maxsize: int - maximum number of kept connections, for each host
+        :param timeout: tuple - default (connect, read) timeout, in seconds
+        :param retries: int - maximum number of retries, on server errors and connection resets
+        :param backoff_factor: float - wait backoff_factor * 2^(retry - 1) seconds between retries
+        """
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=['GET', 'HEAD'],
+            raise_on_status=False,
+        )
+
+        self.pool_maxsize = pool_maxsize
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.mount(self.session)
+
+        self.timeout = timeout
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls):
+        """
+        Return the client shared by all adapters, creating it only one time.
+        :return: HttpClient
+        """
+
+        with cls.SHARED_LOCK:
+            if cls.SHARED is None:
+                cls.SHARED = cls()
+
+        return cls.SHARED
+
+    def get(self, url, **kwargs):
+        """
+        Send a GET request, with the pooled session.
+        :param url: string - URL to query
+        :param kwargs: dict - requests.get() parameters (ex: 'stream', 'headers')
+        :return: requests.Response
+        """
+
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException:
+            self.count(host, errors=1)
+            raise
+
+        # Retries done by the adapter, before this response
+        retries = getattr(response.raw, 'retries', None)
+        self.count(host, requests=1, retries=len(retries.history) if retries is not None else 0)
+
+        return response
+
+    def mount(self, session):
+        """
+        Use the pooled adapter on another session (ex: session of an external package).
+        :param session: requests.Session
+        :return: void
+        """
+
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+
+    def count(self, host, **increments):
+        """
+        Increase statistics of a host.
+        :param host: string
+        :param increments: dict - value to add to 'requests', 'retries' or 'errors'
+        :return: void
+        """
+
+        with self.lock:
+            stats = self.stats.setdefault(host, {"requests": 0, "retries": 0, "errors": 0})
+            for key, value in increments.items():
+                stats[key] += value
+
+    def get_stats(self):
+        """
+        Return requests statistics, and connection pools statistics, by host.
+        'connections' is the number of connections opened by the pool: much lower than 'requests' means keep-alive
+        works, and equal to the pool size means the pool may be too small.
+        :return: dict - for each host, a dict with 'requests', 'retries', 'errors', 'connections' and 'pool_maxsize'
+        """
+
+        with self.lock:
+            stats = {host: dict(values) for host, values in self.stats.items()}
+
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+
+            host = pool.host if pool.port in (None, 80, 443) else f'{pool.host}:{pool.port}'
+            values = stats.setdefault(host, {"requests": 0, "retries": 0, "errors": 0})
+            values["connections"] = values.get("connections", 0) + pool.num_connections
+            values["pool_maxsize"] = self.pool_maxsize
+
+        return stats
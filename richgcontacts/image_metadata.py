@@ -0,0 +1,108 @@
+import os
+import threading
+
+from PIL import Image
+
+from richgcontacts.database import Database
+
+
+class ImageMetadataCache:
+    """
+    Cache of image metadata (file size, dimensions, modification date and format), keyed by path and modification date.
+    Metadata are read from the image header only, when the image is stored, so scoring images never opens them again.
+    Entries are kept in memory, and in the database for the next runs.
+
+    Attributes
+    ----------
+    database : Database
+        database containing the cache
+    entries : dict
+        metadata already read, by path
+    lock : threading.Lock
+        protect entries, when images are scored concurrently
+
+    Methods
+    -------
+    get(image_path)
+        Return metadata of an image, reading its header only if it's not cached.
+    add(image_path)
+        Read the header of an image, and cache its metadata.
+    """
+
+    def __init__(self, database=None):
+        """
+        Init the cache, creating its table if necessary.
+        :param database: Database|None - database to use, the shared one by default
+        """
+
+        self.database = database or Database.get()
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        self.database.create_tables('''
+            CREATE TABLE IF NOT EXISTS image_metadata (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                format TEXT
+            );
+        ''')
+
+    def get(self, image_path):
+        """
+        Return metadata of an image, reading its header only if it's not cached, or if the file has been modified.
+        :param image_path: string
+        :return: dict - contain 'size', 'width', 'height', 'mtime' and 'format'
+        """
+
+        mtime = os.path.getmtime(image_path)
+
+        # From memory
+        with self.lock:
+            metadata = self.entries.get(image_path)
+        if metadata is not None and metadata["mtime"] == mtime:
+            return metadata
+
+        # From database
+        rows = self.database.execute('SELECT * FROM image_metadata WHERE path = ? AND mtime = ?', (image_path, mtime))
+        if len(rows):
+            metadata = {key: rows[0][key] for key in ["size", "width", "height", "mtime", "format"]}
+            with self.lock:
+                self.entries[image_path] = metadata
+            return metadata
+
+        return self.add(image_path)
+
+    def add(self, image_path):
+        """
+        Read the header of an image, and cache its metadata.
+        :param image_path: string
+        :return: dict - contain 'size', 'width', 'height', 'mtime' and 'format'
+        """
+
+        stat = os.stat(image_path)
+
+        # Opening an image only reads its header: pixels are not decoded
+        with Image.open(image_path) as img:
+            width, height = img.size
+            image_format = img.format
+
+        metadata = {
+            "size": stat.st_size,
+            "width": width,
+            "height": height,
+            "mtime": stat.st_mtime,
+            "format": image_format,
+        }
+
+        self.database.execute(
+            'INSERT OR REPLACE INTO image_metadata (path, mtime, size, width, height, format) VALUES (?, ?, ?, ?, ?, ?)',
+            (image_path, metadata["mtime"], metadata["size"], metadata["width"], metadata["height"], metadata["format"])
+        )
+
+        with self.lock:
+            self.entries[image_path] = metadata
+
+        return metadata
@@ -0,0 +1,477 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from richgcontacts import networks
+from richgcontacts.database import Database
+from richgcontacts.globals import *
+from richgcontacts.http_client import HttpClient
+from richgcontacts.image_metadata import ImageMetadataCache
+from richgcontacts.perceptual_index import PerceptualIndex
+
+
+class ImageStore:
+    """
+    Content-addressed store of profile pictures.
+    Each image is stored once, in a file named by the hash of its content, computed while it is downloaded. So
+    identical pictures are detected without decoding them, and are shared by all users and networks.
+    Only identical contents are shared: near-identical pictures (the same picture served with another compression
+    level) are detected with their perceptual hash only within the history of a user (see add_to_history()), as
+    different pictures (ex: two solid colors) may have close perceptual hashes.
+    The history of each user, for a network, is a list of image hashes with their date, stored in an indexed table of
+    the database: the last image, or the full history, of a user is found without scanning any folder.
+
+    Attributes
+    ----------
+    path : string
+        folder containing stored images
+    lock : threading.Lock
+        protect histories, when users are processed concurrently
+    database : Database
+        database containing histories
+    perceptual_index : PerceptualIndex
+        perceptual hashes of stored images
+    threshold : int
+        maximum distance between perceptual hashes of two images, to consider them as the same picture
+    metadata : ImageMetadataCache
+        metadata of stored images, read when they are stored
+    http : HttpClient
+        pooled HTTP client, used for downloads
+
+    Methods
+    -------
+    get_image_path(digest)
+        Return the path of a stored image.
+    get_digest(image_path)
+        Return the hash of an image content.
+    download(url)
+        Download an URL into the store (with a conditional request if possible), and return the hash of its content.
+    get_validator(url)
+        Return validators saved by the last download of an URL.
+    save_validator(url, etag, last_modified, content_length, digest)
+        Save validators of a downloaded URL.
+    add_file(file_path)
+        Move an existing file into the store, and return the hash of its content.
+    get_history(network_name, user_name)
+        Return the history of a user, for a network, order by date DESC.
+    get_last(network_name, user_name)
+        Return the last image of a user history, for a network.
+    add_to_history(network_name, user_name, digest)
+        Add a stored image to the history of a user, if it's not identical to the last one.
+    remove_from_history(network_name, user_name, digest)
+        Remove the last entry of an image from the history of a user.
+    get_perceptual_hash(digest)
+        Return the perceptual hash of a stored image, computing it only one time.
+    is_similar(digest1, digest2)
+        Check if two stored images are the same picture.
+    hash_file(file_path)
+        Return the hash of a file content, read chunk by chunk.
+    """
+
+    # Hash used to name stored images
+    HASH_ALGORITHM = 'sha256'
+
+    # Date given to the first image of a user (so a new image, from another network, is preferred)
+    FIRST_DATE = datetime(1971, 1, 1)
+
+    def __init__(self, path=None, perceptual_index=None, threshold=PERCEPTUAL_HASH_THRESHOLD, metadata=None, database=None, http=None):
+        """
+        Init the store.
+        :param path: string|None - folder containing stored images, 'store' in userdata folder by default
+        :param perceptual_index: PerceptualIndex|None - index of perceptual hashes, the shared one by default
+        :param threshold: int - maximum distance between perceptual hashes of the same picture
+        :param metadata: ImageMetadataCache|None - cache of images metadata, on the shared database by default
+        :param database: Database|None - database containing histories, the shared one by default
+        :param http: HttpClient|None - client used for downloads, the shared one by default
+        """
+
+        self.path = path or os.path.join(userdata_path, 'store')
+        self.lock = threading.Lock()
+        self.database = database or Database.get()
+        self.perceptual_index = perceptual_index or PerceptualIndex(self.database)
+        self.threshold = threshold
+        self.metadata = metadata or ImageMetadataCache(self.database)
+        self.http = http or HttpClient.get_shared()
+
+        self.database.create_tables('''
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                network_name TEXT NOT NULL,
+                user_name TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                date REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_user ON history (network_name, user_name, date);
+            CREATE TABLE IF NOT EXISTS store_migrations (
+                name TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                digest TEXT NOT NULL
+            );
+        ''')
+
+        # Import histories of previous versions
+        self.import_user_folders()
+
+    def get_image_path(self, digest):
+        """
+        Return the path of a stored image.
+        Images are split in sub-folders, by the first characters of their hash.
+        :param digest: string - hash of the image content
+        :return: string
+        """
+
+        return os.path.join(self.path, digest[:2], digest + '.jpg')
+
+    def get_digest(self, image_path):
+        """
+        Return the hash of an image content.
+        For a stored image, it's its file name, so the file is not read.
+        :param image_path: string
+        :return: string
+        """
+
+        if os.path.dirname(os.path.dirname(os.path.abspath(image_path))) == os.path.abspath(self.path):
+            return os.path.splitext(os.path.basename(image_path))[0]
+
+        return self.hash_file(image_path)
+
+    def download(self, url):
+        """
+        Download an URL into the store, and return the hash of its content.
+        If this URL has already been downloaded, a conditional request is done with its saved validators (ETag and
+        Last-Modified): if the server answers '304 Not Modified', nothing is downloaded nor written.
+        Else, the content is written chunk by chunk in a temporary file, and hashed at the same time.
+        :param url: string - URL to query
+        :return: string - hash of the image content
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+        file_hash = hashlib.new(self.HASH_ALGORITHM)
+
+        # Prepare conditional request, if the image of the last download is still stored
+        validator = self.get_validator(url)
+        if validator is not None and not os.path.exists(self.get_image_path(validator["digest"])):
+            validator = None
+
+        headers = {}
+        if validator is not None and validator["etag"]:
+            headers["If-None-Match"] = validator["etag"]
+        if validator is not None and validator["last_modified"]:
+            headers["If-Modified-Since"] = validator["last_modified"]
+
+        with self.http.get(url, stream=True, headers=headers) as response:
+
+            # Not modified: use the stored image
+            if response.status_code == 304 and validator is not None:
+                return validator["digest"]
+
+            if response.status_code != 200:
+                raise Exception("Impossible de télécharger la photo de profil.")
+
+            # Server ignoring conditional requests, but with the same ETag: don't read the content
+            etag = response.headers.get('ETag')
+            if validator is not None and etag and etag == validator["etag"]:
+                return validator["digest"]
+
+            with tempfile.NamedTemporaryFile(dir=self.path, suffix='.part', delete=False) as f:
+                try:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        file_hash.update(chunk)
+                        f.write(chunk)
+                except BaseException:
+                    f.close()
+                    os.remove(f.name)
+                    raise
+
+            digest = self.store_file(f.name, file_hash.hexdigest())
+
+            # Keep validators, for the next download of this URL
+            self.save_validator(url, etag, response.headers.get('Last-Modified'), response.headers.get('Content-Length'), digest)
+
+        return digest
+
+    def get_validator(self, url):
+        """
+        Return validators saved by the last download of an URL.
+        :param url: string
+        :return: dict|None - dict with 'etag', 'last_modified', 'content_length' and 'digest'
+        """
+
+        rows = self.database.execute('SELECT etag, last_modified, content_length, digest FROM validators WHERE url = ?', (url,))
+
+        return dict(rows[0]) if len(rows) else None
+
+    def save_validator(self, url, etag, last_modified, content_length, digest):
+        """
+        Save validators of a downloaded URL.
+        :param url: string
+        :param etag: string|None - 'ETag' header
+        :param last_modified: string|None - 'Last-Modified' header
+        :param content_length: string|None - 'Content-Length' header
+        :param digest: string - hash of the stored image
+        :return: void
+        """
+
+        self.database.execute(
+            'INSERT OR REPLACE INTO validators (url, etag, last_modified, content_length, digest) VALUES (?, ?, ?, ?, ?)',
+            (url, etag, last_modified, int(content_length) if content_length and content_length.isdigit() else None, digest)
+        )
+
+    def add_file(self, file_path):
+        """
+        Move an existing file into the store, and return the hash of its content.
+        :param file_path: string - file to move
+        :return: string - hash of the image content
+        """
+
+        return self.store_file(file_path, self.hash_file(file_path))
+
+    def store_file(self, file_path, digest):
+        """
+        Move a file to its path in the store, or delete it if this image is already stored.
+        :param file_path: string - file to move
+        :param digest: string - hash of the file content
+        :return: string - hash of the image content
+        """
+
+        image_path = self.get_image_path(digest)
+
+        if os.path.exists(image_path):
+            os.remove(file_path)
+            return digest
+
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        os.replace(file_path, image_path)
+
+        # Compute the perceptual hash of the new image, one time for all
+        try:
+            phash = PerceptualIndex.compute_hash(image_path)
+        except (OSError, ValueError):
+            # Not a readable image: keep it as it is
+            return digest
+
+        self.perceptual_index.add(digest, phash)
+
+        # Cache image metadata now, from its header, so scoring it never opens it again
+        self.metadata.add(image_path)
+
+        return digest
+
+    def get_history(self, network_name, user_name, limit=None):
+        """
+        Return the history of a user, for a network, order by date DESC.
+        :param network_name: string
+        :param user_name: string
+        :param limit: int|None - return only the last images, with an indexed lookup (None for the whole history)
+        :return: list - dict with 'digest', 'date' (timestamp) and 'image_path'
+        """
+
+        rows = self.database.execute(
+            'SELECT digest, date FROM history WHERE network_name = ? AND user_name = ? ORDER BY date DESC, id DESC LIMIT ?',
+            (network_name, user_name, limit if limit is not None else -1)
+        )
+
+        return [self.format_history_entry(row) for row in rows]
+
+    def get_last(self, network_name, user_name):
+        """
+        Return the last image of a user history, for a network, with an indexed lookup.
+        :param network_name: string
+        :param user_name: string
+        :return: dict|None - dict with 'digest', 'date' (timestamp) and 'image_path'
+        """
+
+        rows = self.database.execute(
+            'SELECT digest, date FROM history WHERE network_name = ? AND user_name = ? ORDER BY date DESC, id DESC LIMIT 1',
+            (network_name, user_name)
+        )
+
+        return self.format_history_entry(rows[0]) if len(rows) else None
+
+    def format_history_entry(self, row):
+        """
+        Format a history row.
+        :param row: sqlite3.Row - with 'digest' and 'date'
+        :return: dict - dict with 'digest', 'date' (timestamp) and 'image_path'
+        """
+
+        return {
+            "digest": row["digest"],
+            "date": row["date"],
+            "image_path": self.get_image_path(row["digest"]),
+        }
+
+    def add_to_history(self, network_name, user_name, digest):
+        """
+        Add a stored image to the history of a user, if it's not identical to the last one.
+        :param network_name: string
+        :param user_name: string
+        :param digest: string - hash of the image content
+        :return: dict - last entry of the user history, with 'digest', 'date', 'image_path' and 'added' (False if the
+            image is identical to the previous last one)
+        """
+
+        with self.lock:
+            last = self.get_last(network_name, user_name)
+
+            # Images are identical if their hashes are equal, or their perceptual hashes close: nothing to add
+            if last is not None and self.is_similar(last["digest"], digest):
+                return dict(last, added=False)
+
+            date_to_use = datetime.now() if last is not None else self.FIRST_DATE
+
+            self.database.execute(
+                'INSERT INTO history (network_name, user_name, digest, date) VALUES (?, ?, ?, ?)',
+                (network_name, user_name, digest, date_to_use.timestamp())
+            )
+
+        return {
+            "digest": digest,
+            "date": date_to_use.timestamp(),
+            "image_path": self.get_image_path(digest),
+            "added": True,
+        }
+
+    def remove_from_history(self, network_name, user_name, digest):
+        """
+        Remove the last entry of an image from the history of a user.
+        The stored image is kept, because it may be used by other users.
+        :param network_name: string
+        :param user_name: string
+        :param digest: string - hash of the image content
+        :return: void
+        """
+
+        with self.lock:
+            self.database.execute(
+                '''DELETE FROM history WHERE id = (
+                    SELECT id FROM history WHERE network_name = ? AND user_name = ? AND digest = ?
+                    ORDER BY date DESC, id DESC LIMIT 1
+                )''',
+                (network_name, user_name, digest)
+            )
+
+    def get_perceptual_hash(self, digest):
+        """
+        Return the perceptual hash of a stored image, computing it only one time.
+        :param digest: string - hash of the image content
+        :return: int|None - None if the image can't be read
+        """
+
+        phash = self.perceptual_index.get(digest)
+
+        if phash is None:
+            try:
+                phash = PerceptualIndex.compute_hash(self.get_image_path(digest))
+            except (OSError, ValueError):
+                return None
+
+            self.perceptual_index.add(digest, phash)
+
+        return phash
+
+    def is_similar(self, digest1, digest2):
+        """
+        Check if two stored images are the same picture: same content, or close perceptual hashes.
+        :param digest1: string - hash of the first image content
+        :param digest2: string - hash of the second image content
+        :return: bool
+        """
+
+        if digest1 == digest2:
+            return True
+
+        phash1 = self.get_perceptual_hash(digest1)
+        phash2 = self.get_perceptual_hash(digest2)
+
+        if phash1 is None or phash2 is None:
+            return False
+
+        return PerceptualIndex.distance(phash1, phash2) <= self.threshold
+
+    def import_user_folders(self):
+        """
+        Import histories stored in user folders by previous versions, one time for all:
+        'history.json' files, or images stored directly in the user folder (moved into the store).
+        Only folders of managed networks are scanned, and only user folders containing a history or images (other
+        folders of the user data, like optimized uploads or the WhatsApp browser profile, are not histories).
+        :return: void
+        """
+
+        if len(self.database.execute("SELECT name FROM store_migrations WHERE name = 'user_folders'")):
+            return
+
+        for network_name in os.listdir(userdata_path) if os.path.isdir(userdata_path) else []:
+            network_path = os.path.join(userdata_path, network_name)
+            if not networks.is_managed(network_name) or not os.path.isdir(network_path):
+                continue
+
+            for user_name in os.listdir(network_path):
+                folder_path = os.path.join(network_path, user_name)
+                if not os.path.isdir(folder_path):
+                    continue
+
+                history_path = os.path.join(folder_path, 'history.json')
+
+                # Skip folders which are not user folders
+                if not os.path.exists(history_path) and not len(glob.glob(folder_path + '/*.jpg')):
+                    continue
+
+                if os.path.exists(history_path):
+                    with open(history_path, 'r') as file:
+                        history = json.load(file)
+                else:
+                    history = self.import_legacy_images(folder_path)
+
+                self.database.execute_many(
+                    'INSERT INTO history (network_name, user_name, digest, date) VALUES (?, ?, ?, ?)',
+                    [(network_name, user_name, entry["digest"], entry["date"]) for entry in history]
+                )
+
+                if os.path.exists(history_path):
+                    os.remove(history_path)
+
+        self.database.execute("INSERT INTO store_migrations (name) VALUES ('user_folders')")
+
+    def import_legacy_images(self, folder_path):
+        """
+        Move images stored directly in a user folder into the store, and return their history.
+        :param folder_path: string - user folder
+        :return: list - dict with 'digest' and 'date', order by date ASC
+        """
+
+        history = []
+        for file_path in sorted(glob.glob(folder_path + '/*.jpg'), key=os.path.getmtime):
+            date = os.path.getmtime(file_path)
+            digest = self.add_file(file_path)
+
+            # Legacy images were already deduplicated, except on identical consecutive images
+            if not len(history) or not self.is_similar(history[-1]["digest"], digest):
+                history.append({"digest": digest, "date": date})
+
+        return history
+
+    @classmethod
+    def hash_file(cls, file_path):
+        """
+        Return the hash of a file content, read chunk by chunk.
+        :param file_path: string
+        :return: string
+        """
+
+        file_hash = hashlib.new(cls.HASH_ALGORITHM)
+
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b''):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
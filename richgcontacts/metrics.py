@@ -0,0 +1,301 @@
+import contextlib
+import json
+import re
+import threading
+import time
+
+from richgcontacts.globals import *
+from richgcontacts.http_client import HttpClient
+
+
+class Metrics:
+    """
+    Timings, counts and error classes of a synchronization run, by stage, by network and by contact.
+    Stages are measured with spans (ex: 'list', 'lookup', 'download', 'fetch', 'choose', 'optimize', 'upload'), and
+    other events with counters. At the end of the run, metrics are exported as JSON, and as a Prometheus text file
+    (ex: for the textfile collector of node_exporter).
+
+    Attributes
+    ----------
+    started_at : float
+        run start timestamp
+    stages : dict
+        for each (stage, network) key, number of calls, total and maximum seconds, and errors count by error class
+    contacts : dict
+        for each contact, seconds and error class of each of its stages
+    counters : dict
+        value of each (name, network) counter
+    lock : threading.Lock
+        protect values, when contacts are processed concurrently
+
+    Methods
+    -------
+    start_run()
+        Start the metrics of a new run, used by all modules until the next run.
+    get_current()
+        Return the metrics of the current run.
+    span(stage, network, contact)
+        Measure a block of code as a stage.
+    record(stage, seconds, network, contact, error)
+        Record a stage call.
+    count(name, value, network)
+        Increase a counter.
+    get_error_class(error)
+        Return the error class of an exception or of a process error.
+    get_http_stats()
+        Return statistics of the shared HTTP client, by host.
+    to_dict()
+        Return metrics, as a JSON serializable dict.
+    to_prometheus()
+        Return metrics, in the Prometheus text format.
+    export(path)
+        Write metrics files of the run.
+    """
+
+    # Metrics of the current run (replaced on each run)
+    CURRENT = None
+    CURRENT_LOCK = threading.Lock()
+
+    # Prefix of Prometheus metrics names
+    PROMETHEUS_PREFIX = "richgcontacts_last_run_"
+
+    def __init__(self):
+        """
+        Init empty metrics.
+        """
+
+        self.started_at = time.time()
+        self.stages = {}
+        self.contacts = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def start_run(cls):
+        """
+        Start the metrics of a new run, used by all modules until the next run.
+        :return: Metrics
+        """
+
+        with cls.CURRENT_LOCK:
+            cls.CURRENT = cls()
+
+        return cls.CURRENT
+
+    @classmethod
+    def get_current(cls):
+        """
+        Return the metrics of the current run, creating them if no run has been started.
+        :return: Metrics
+        """
+
+        with cls.CURRENT_LOCK:
+            if cls.CURRENT is None:
+                cls.CURRENT = cls()
+
+        return cls.CURRENT
+
+    @contextlib.contextmanager
+    def span(self, stage, network=None, contact=None):
+        """
+        Measure a block of code as a stage. An exception raised by the block is recorded with its class, and raised
+        again. Set the 'error' key of the yielded dict to record a process error (ex: {"success": False, ...} results).
+        :param stage: string - stage name
+        :param network: string|None - social network name, if the stage is done for a network
+        :param contact: string|None - contact resource name, if the stage is done for a contact
+        :return: generator - yield a dict, with 'error' key
+        """
+
+        span = {"error": None}
+        start = time.perf_counter()
+
+        try:
+            yield span
+        except BaseException as err:
+            span["error"] = err
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, network, contact, span["error"])
+
+    def record(self, stage, seconds, network=None, contact=None, error=None):
+        """
+        Record a stage call.
+        :param stage: string - stage name
+        :param seconds: float - duration of the call
+        :param network: string|None - social network name
+        :param contact: string|None - contact resource name
+        :param error: Exception|string|None - error of the call, if it has failed
+        :return: void
+        """
+
+        error_class = self.get_error_class(error)
+
+        with self.lock:
+            values = self.stages.setdefault((stage, network), {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": {}})
+            values["calls"] += 1
+            values["seconds"] += seconds
+            values["max_seconds"] = max(values["max_seconds"], seconds)
+            if error_class is not None:
+                values["errors"][error_class] = values["errors"].get(error_class, 0) + 1
+
+            if contact is not None:
+                key = stage if network is None else f'{stage}.{network}'
+                self.contacts.setdefault(contact, {})[key] = {"seconds": round(seconds, 6), "error": error_class}
+
+    def count(self, name, value=1, network=None):
+        """
+        Increase a counter.
+        :param name: string - counter name (ex: 'lookup_cache_hits')
+        :param value: int|float
+        :param network: string|None - social network name
+        :return: void
+        """
+
+        with self.lock:
+            self.counters[(name, network)] = self.counters.get((name, network), 0) + value
+
+    @staticmethod
+    def get_error_class(error):
+        """
+        Return the error class of an exception (its class name) or of a process error (ex: 'user_not_found').
+        Free text errors are grouped as 'other', so classes stay few.
+        :param error: Exception|string|None
+        :return: string|None - None if there is no error
+        """
+
+        if error is None:
+            return None
+
+        if isinstance(error, BaseException):
+            return type(error).__name__
+
+        error = str(error)
+        if re.fullmatch(r'[a-z][a-z0-9_]*', error):
+            return error
+
+        return "other"
+
+    @staticmethod
+    def get_http_stats():
+        """
+        Return statistics of the shared HTTP client, by host: requests, retries and errors, connections opened by its
+        pool and pool size (to tune HTTP_POOL_MAXSIZE). They are counted since the process has started.
+        :return: dict - returned by HttpClient.get_stats(), empty if the client has not been used
+        """
+
+        if HttpClient.SHARED is None:
+            return {}
+
+        return HttpClient.SHARED.get_stats()
+
+    def to_dict(self):
+        """
+        Return metrics, as a JSON serializable dict.
+        :return: dict - 'started_at', 'duration_seconds', 'stages', 'counters', 'http' and 'contacts'
+        """
+
+        http = self.get_http_stats()
+
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 6),
+                "stages": [
+                    {
+                        "stage": stage,
+                        "network": network,
+                        "calls": values["calls"],
+                        "seconds": round(values["seconds"], 6),
+                        "max_seconds": round(values["max_seconds"], 6),
+                        "errors": dict(values["errors"]),
+                    }
+                    for (stage, network), values in sorted(self.stages.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+                ],
+                "counters": [
+                    {"name": name, "network": network, "value": value}
+                    for (name, network), value in sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+                ],
+                "http": http,
+                "contacts": {contact: dict(stages) for contact, stages in self.contacts.items()},
+            }
+
+    def to_prometheus(self):
+        """
+        Return metrics, in the Prometheus text format. Values are those of the last run, so they are gauges.
+        :return: string
+        """
+
+        data = self.to_dict()
+        prefix = self.PROMETHEUS_PREFIX
+
+        def labels(**values):
+            items = [f'{key}="{value}"' for key, value in values.items() if value is not None]
+            return '{' + ','.join(items) + '}' if items else ''
+
+        lines = [
+            f'# HELP {prefix}timestamp_seconds Start time of the last run.',
+            f'# TYPE {prefix}timestamp_seconds gauge',
+            f'{prefix}timestamp_seconds {data["started_at"]:.3f}',
+            f'# HELP {prefix}duration_seconds Duration of the last run.',
+            f'# TYPE {prefix}duration_seconds gauge',
+            f'{prefix}duration_seconds {data["duration_seconds"]}',
+            f'# HELP {prefix}contacts Contacts with measured stages, during the last run.',
+            f'# TYPE {prefix}contacts gauge',
+            f'{prefix}contacts {len(data["contacts"])}',
+        ]
+
+        metrics = [
+            ("stage_calls", "Calls of each stage, during the last run.", "calls"),
+            ("stage_seconds", "Time spent in each stage (summed over concurrent calls), during the last run.", "seconds"),
+            ("stage_max_seconds", "Longest call of each stage, during the last run.", "max_seconds"),
+        ]
+        for name, description, key in metrics:
+            lines += [f'# HELP {prefix}{name} {description}', f'# TYPE {prefix}{name} gauge']
+            lines += [f'{prefix}{name}{labels(stage=item["stage"], network=item["network"])} {item[key]}' for item in data["stages"]]
+
+        lines += [f'# HELP {prefix}stage_errors Failed calls of each stage by error class, during the last run.', f'# TYPE {prefix}stage_errors gauge']
+        for item in data["stages"]:
+            for error_class, value in sorted(item["errors"].items()):
+                lines.append(f'{prefix}stage_errors{labels(stage=item["stage"], network=item["network"], error=error_class)} {value}')
+
+        lines += [f'# HELP {prefix}events Events counted during the last run.', f'# TYPE {prefix}events gauge']
+        lines += [f'{prefix}events{labels(name=item["name"], network=item["network"])} {item["value"]}' for item in data["counters"]]
+
+        metrics = [
+            ("http_requests", "HTTP requests sent by the shared client, by host, since the process has started.", "requests"),
+            ("http_retries", "HTTP retries on server errors and connection resets, by host, since the process has started.", "retries"),
+            ("http_errors", "Failed HTTP requests, by host, since the process has started.", "errors"),
+            ("http_connections", "Connections opened by the pool of each host, since the process has started.", "connections"),
+            ("http_pool_maxsize", "Maximum number of kept connections, for each host.", "pool_maxsize"),
+        ]
+        for name, description, key in metrics:
+            lines += [f'# HELP {prefix}{name} {description}', f'# TYPE {prefix}{name} gauge']
+            lines += [f'{prefix}{name}{labels(host=host)} {values[key]}' for host, values in sorted(data["http"].items()) if key in values]
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path=None):
+        """
+        Write metrics files of the run: 'last_run.json' and 'richgcontacts.prom' (replaced by each run).
+        :param path: string|None - folder of metrics files, in the user data folder by default
+        :return: dict - 'json' and 'prometheus' files paths
+        """
+
+        path = path or os.path.join(userdata_path, 'metrics')
+        os.makedirs(path, exist_ok=True)
+
+        paths = {
+            "json": os.path.join(path, 'last_run.json'),
+            "prometheus": os.path.join(path, 'richgcontacts.prom'),
+        }
+
+        # Write temporary files first, so a collector never reads a truncated file
+        with open(paths["json"] + '.part', 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        os.replace(paths["json"] + '.part', paths["json"])
+
+        with open(paths["prometheus"] + '.part', 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(paths["prometheus"] + '.part', paths["prometheus"])
+
+        return paths
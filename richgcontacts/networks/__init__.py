@@ -0,0 +1,40 @@
+import importlib
+import threading
+
+# Managed social networks: module and class of their adapter (a module is imported only when a contact uses it)
+ADAPTERS = {
+    "instagram": ("richgcontacts.networks.instagram", "InstagramAdapter"),
+    "facebook": ("richgcontacts.networks.facebook", "FacebookAdapter"),
+    "whatsapp": ("richgcontacts.networks.whatsapp", "WhatsAppAdapter"),
+}
+
+# Adapter of each social network (instantiated only one time)
+INSTANCES = {}
+
+# Protect adapters instantiation, when contacts are processed concurrently
+LOCK = threading.Lock()
+
+
+def is_managed(network_name):
+    """
+    Check if wanted social network is managed.
+    :param network_name: string
+    :return: bool
+    """
+
+    return network_name in ADAPTERS
+
+
+def get_adapter(network_name):
+    """
+    Return the adapter of a social network, importing its module the first time.
+    :param network_name: string - must be in ADAPTERS
+    :return: NetworkAdapter
+    """
+
+    with LOCK:
+        if network_name not in INSTANCES:
+            module_name, class_name = ADAPTERS[network_name]
+            INSTANCES[network_name] = getattr(importlib.import_module(module_name), class_name)()
+
+    return INSTANCES[network_name]
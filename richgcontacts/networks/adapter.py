@@ -0,0 +1,50 @@
+import threading
+
+
+class NetworkAdapter:
+    """
+    Base class of social network adapters.
+    An adapter wraps the external package of a network. It's created only when a contact uses this network, and
+    shared by all users.
+
+    Attributes
+    ----------
+    network_name : string
+        Name of the network
+    lock : threading.Lock
+        protect the external package instantiation, when contacts are processed concurrently
+
+    Methods
+    -------
+    instantiate()
+        Instantiate the external package, only one time.
+    get_profile_picture_url(user_name)
+        Return the profile picture URL of a user.
+    """
+
+    network_name = None
+
+    def __init__(self):
+        """
+        Init the adapter, without instantiating its external package.
+        """
+
+        self.lock = threading.Lock()
+
+    def instantiate(self):
+        """
+        Instantiate the external package, only one time. Called with the adapter lock.
+        :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
+        """
+
+        return None
+
+    def get_profile_picture_url(self, user_name):
+        """
+        Return the profile picture URL of a user.
+        :param user_name: string - name of the user, for this network
+        :return: dict - success of the process, profile picture URL, and 'birthday' if the network gives it (dict with
+        'month', 'day' and optionally 'year', as expected by People API)
+        """
+
+        raise NotImplementedError
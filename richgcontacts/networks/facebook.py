@@ -0,0 +1,168 @@
+import re
+import warnings
+
+import facebook_scraper
+from facebook_scraper import get_profile
+from facebook_scraper.exceptions import TemporarilyBanned
+from requests import HTTPError
+
+from richgcontacts.http_client import HttpClient
+from richgcontacts.networks.adapter import NetworkAdapter
+
+
+class FacebookAdapter(NetworkAdapter):
+    """
+    Use facebook-scraper, to get Facebook profile pictures.
+
+    Methods
+    -------
+    instantiate()
+        Instantiate "facebook-scrapper" package.
+    get_profile_picture_url(user_name)
+        Use facebook-scraper, to get a Facebook profile picture URL, and the user birthday.
+    parse_birthday(basic_info)
+        Return the birthday found in the 'Basic Info' section of a profile.
+    """
+
+    network_name = "facebook"
+
+    # Month names, as written in profiles (English and French)
+    MONTHS = {
+        "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+        "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+        "janvier": 1, "février": 2, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6,
+        "juillet": 7, "août": 8, "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "décembre": 12, "decembre": 12,
+    }
+
+    # 'Basic Info' keys containing the birthday, and the birth year (English and French)
+    BIRTHDAY_KEYS = ["Birthday", "Date de naissance"]
+    BIRTH_YEAR_KEYS = ["Birth year", "Année de naissance"]
+
+    def instantiate(self):
+        """
+        Instantiate "facebook-scrapper" package: use the shared connection pools for its session
+        :return: void - nothing to return
+        """
+
+        # Use the shared connection pools for Facebook requests
+        scraper = getattr(facebook_scraper, '_scraper', None)
+        if scraper is not None and getattr(scraper, 'session', None) is not None:
+            HttpClient.get_shared().mount(scraper.session)
+
+    def get_profile_picture_url(self, user_name):
+        """
+        Use facebook-scraper, to get a Facebook profile picture URL, and the user birthday (same profile page).
+        :param user_name: string - Facebook user name
+        :return: dict - success of the process, profile picture URL, and birthday (or None)
+        """
+
+        try:
+
+            # Disable module warnings
+            old_warnings_filters = warnings.filters
+            warnings.filterwarnings('ignore')
+
+            # Disable print return
+            # sys.stdout = open(os.devnull, 'w')
+            # sys.stderr = open(os.devnull, 'w')
+
+            # Use facebook-scraper, for trying to get user data
+            profile_data = get_profile(user_name)
+
+            # Re-activate module warnings
+            warnings.filters = old_warnings_filters
+
+            # Enable print return
+            # sys.stdout = sys.__stdout__
+            # sys.stderr = sys.__stderr__
+
+            # Check if user has been found
+            if profile_data["Name"] == "Contenu introuvable":
+                return {
+                    "success": False,
+                    "error": "user_not_found",
+                }
+
+            # If no except, try to get profile picture
+            if not profile_data["profile_picture"]:
+                return {
+                    "success": False,
+                    "error": "picture_not_found",
+                }
+
+            # Return image URL
+            return {
+                "success": True,
+                "error": None,
+                "url": profile_data["profile_picture"],
+                "birthday": self.parse_birthday(profile_data.get("Basic Info")),
+            }
+
+        except TemporarilyBanned:
+            return {
+                "success": False,
+                "error": "rate_limited",
+            }
+        except HTTPError as err:
+            if '404' in str(err):
+                return {
+                    "success": False,
+                    "error": "user_not_found",
+                }
+            elif '429' in str(err):
+                return {
+                    "success": False,
+                    "error": "rate_limited",
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "http_error",
+                }
+        except Exception as err:
+            if '(cookies) is required' in str(err):
+                return {
+                    "success": False,
+                    "error": "user_private",
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": str(err),
+                }
+
+    @classmethod
+    def parse_birthday(cls, basic_info):
+        """
+        Return the birthday found in the 'Basic Info' section of a profile (ex: "March 3, 1990", "3 mars").
+        :param basic_info: dict|string|None - 'Basic Info' returned by get_profile()
+        :return: dict|None - 'month', 'day' and optionally 'year', or None if there is no readable birthday
+        """
+
+        if not isinstance(basic_info, dict):
+            return None
+
+        text = next((basic_info[key] for key in cls.BIRTHDAY_KEYS if basic_info.get(key)), None)
+        if text is None:
+            return None
+
+        # Split words and numbers (ex: "1er" is "1" and "er")
+        words = re.findall(r'\d+|[^\W\d]+', text.lower())
+        numbers = [int(word) for word in words if word.isdigit()]
+
+        month = next((cls.MONTHS[word] for word in words if word in cls.MONTHS), None)
+        day = next((number for number in numbers if 1 <= number <= 31), None)
+        if month is None or day is None:
+            return None
+
+        birthday = {"month": month, "day": day}
+
+        # Year is in the birthday, or in its own field
+        year = next((number for number in numbers if number > 1000), None)
+        if year is None:
+            year_text = next((basic_info[key] for key in cls.BIRTH_YEAR_KEYS if basic_info.get(key)), '')
+            year = next((int(word) for word in re.findall(r'\d{4}', year_text)), None)
+        if year is not None:
+            birthday["year"] = year
+
+        return birthday
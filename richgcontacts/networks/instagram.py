@@ -0,0 +1,113 @@
+import instaloader
+from instaloader import Profile, ProfileNotExistsException, TooManyRequestsException
+
+from richgcontacts.globals import *
+from richgcontacts.http_client import HttpClient
+from richgcontacts.networks.adapter import NetworkAdapter
+
+
+class InstagramAdapter(NetworkAdapter):
+    """
+    Use Instaloader, to get Instagram profile pictures.
+
+    Attributes
+    ----------
+    loader : instaloader.Instaloader|None
+        Instaloader instance, None until instantiate() is called
+
+    Methods
+    -------
+    instantiate()
+        Instantiate "instaloader" package.
+    get_profile_picture_url(user_name)
+        Use Instaloader, to get an Instagram profile picture URL.
+    """
+
+    network_name = "instagram"
+
+    def __init__(self):
+        """
+        Init the adapter, without instantiating Instaloader.
+        """
+
+        super().__init__()
+        self.loader = None
+
+    def instantiate(self):
+        """
+        Instantiate "instaloader" package
+        :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
+        """
+
+        # Do not process if object has already been instantiated
+        if self.loader is not None:
+            return
+
+        try:
+            # Prepare file path
+            folder_path = os.path.join(userdata_path, self.network_name)
+            folder_path = os.path.join(folder_path, '{target}')
+
+            # Init Instaloader
+            self.loader = instaloader.Instaloader(dirname_pattern=folder_path, quiet=True)
+
+            # Overwrite function, for disable print errors
+            def nothing(msg, repeat_at_end=True):
+                pass
+            self.loader.context.error = nothing
+
+            # Overwrite function, for raising rate limit errors instead of sleeping (the network rate limiter pauses
+            # only Instagram lookups, and retries them)
+            def raise_429(query_type):
+                raise TooManyRequestsException(f"429 Too Many Requests ({query_type})")
+            self.loader.context._rate_controller.handle_429 = raise_429
+
+            # Use the shared connection pools for Instagram requests
+            HttpClient.get_shared().mount(self.loader.context._session)
+
+        except Exception as err:
+            return {
+                "success": False,
+                "error": str(err),
+            }
+
+    def get_profile_picture_url(self, user_name):
+        """
+        Use Instaloader, to get an Instagram profile picture URL.
+        :param user_name: string - Instagram user name
+        :return: dict - success of the process, and profile picture URL
+        """
+
+        try:
+
+            # Instantiate instaloader.Profile class, for given user_name
+            user_profile = Profile.from_username(self.loader.context, user_name)
+
+            # Return profile picture URL (in the best available resolution)
+            return {
+                "success": True,
+                "error": None,
+                "url": user_profile.profile_pic_url,
+            }
+
+        except ProfileNotExistsException:
+            return {
+                "success": False,
+                "error": "user_not_found",
+            }
+        except TooManyRequestsException:
+            return {
+                "success": False,
+                "error": "rate_limited",
+            }
+        except Exception as err:
+            if '429' in str(err):
+                return {
+                    "success": False,
+                    "error": "rate_limited",
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": str(err),
+                }
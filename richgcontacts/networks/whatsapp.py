@@ -0,0 +1,244 @@
+import sys
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+
+from richgcontacts.globals import *
+from richgcontacts.networks.adapter import NetworkAdapter
+
+
+class WhatsAppAdapter(NetworkAdapter):
+    """
+    Use Selenium with WhatsApp Web, to get What's App account profile pictures.
+
+    Attributes
+    ----------
+    driver : selenium.webdriver.Chrome|None
+        WhatsApp Web page, None until instantiate() succeeds
+    error : dict|None
+        instantiation error, to fail fast on next contacts
+
+    Methods
+    -------
+    instantiate()
+        Instantiate "selenium" package, and open WhatsApp Web in Chrome with the persistent browser profile.
+    start_driver(headless)
+        Open WhatsApp Web in Chrome, with the browser profile kept under the user data folder.
+    is_logged_in(driver, timeout)
+        Wait for WhatsApp Web to show either the chats list or the login QR code.
+    get_profile_picture_url(user_name)
+        Use Selenium, to get a What's App account profile picture URL.
+    """
+
+    network_name = "whatsapp"
+
+    def __init__(self):
+        """
+        Init the adapter, without opening Chrome.
+        """
+
+        super().__init__()
+        self.driver = None
+        self.error = None
+
+    def instantiate(self):
+        """
+        Instantiate "selenium" package, and open WhatsApp Web in Chrome with the persistent browser profile.
+        If the session of the profile is still logged in, Chrome is headless. Else, a visible Chrome is opened for the
+        user to scan the QR code, only if the app runs in a terminal: unattended runs fail fast.
+        :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
+        """
+
+        # Do not process if object has already been instantiated, or if it has already failed
+        if self.driver is not None:
+            return
+        if self.error is not None:
+            return self.error
+
+        driver = None
+
+        try:
+
+            # Open 'WhatsApp Web', using the session saved by previous runs
+            driver = self.start_driver(headless=WHATSAPP_HEADLESS)
+
+            if not self.is_logged_in(driver, WHATSAPP_LOAD_TIMEOUT):
+                driver.quit()
+                driver = None
+
+                # Without terminal, nobody can scan the QR code
+                if not sys.stdin.isatty():
+                    raise Exception("whatsapp_not_logged_in")
+
+                # Open a visible Chrome, and wait for the user to log into their account
+                driver = self.start_driver(headless=False)
+                print('\n    \u001b[33mLog in to WhatsApp Web by scanning the QR code, the session will be kept for next runs.\u001b[0m')
+                try:
+                    WebDriverWait(driver, WHATSAPP_LOGIN_TIMEOUT, poll_frequency=0.5).until(
+                        expected_conditions.presence_of_element_located((By.ID, 'side'))
+                    )
+                except TimeoutException:
+                    raise Exception("whatsapp_not_logged_in")
+
+            # Save Selenium instance
+            self.driver = driver
+
+        except Exception as err:
+            if driver is not None:
+                driver.quit()
+
+            # Remember the error, so Chrome is not opened again for each contact
+            self.error = {
+                "success": False,
+                "error": str(err),
+            }
+            return self.error
+
+    @staticmethod
+    def start_driver(headless):
+        """
+        Open WhatsApp Web in Chrome, with the browser profile kept under the user data folder.
+        :param headless: bool - open Chrome without window
+        :return: selenium.webdriver.Chrome
+        """
+
+        # Init web browser, keeping cookies and local storage (so the WhatsApp session) between runs
+        options = webdriver.ChromeOptions()
+        # options.binary_location = "C:/Program Files/BraveSoftware/Brave-Browser/Application/brave.exe"
+        options.add_argument('--user-data-dir=' + os.path.join(userdata_path, 'whatsapp', 'browser'))
+        if headless:
+            options.add_argument('--headless=new')
+            options.add_argument('--window-size=1280,1000')
+        service = ChromeService()
+        driver = webdriver.Chrome(service=service, options=options)
+
+        # WhatsApp Web refuses headless browsers: use the user agent of a normal Chrome
+        if headless:
+            user_agent = driver.execute_script('return navigator.userAgent').replace('HeadlessChrome', 'Chrome')
+            driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": user_agent})
+
+        # Open 'WhatsApp Web' in Chrome
+        driver.get("https://web.whatsapp.com/")
+
+        return driver
+
+    @staticmethod
+    def is_logged_in(driver, timeout):
+        """
+        Wait for WhatsApp Web to show either the chats list (logged in) or the login QR code (logged out).
+        :param driver: selenium.webdriver.Chrome - WhatsApp Web page
+        :param timeout: float - maximum waiting time, in seconds, for the page to load
+        :return: bool
+        """
+
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.5).until(expected_conditions.any_of(
+                expected_conditions.presence_of_element_located((By.ID, 'side')),
+                expected_conditions.presence_of_element_located((By.CSS_SELECTOR, 'div[data-ref] canvas')),
+            ))
+        except TimeoutException:
+            return False
+
+        return len(driver.find_elements(By.ID, 'side')) > 0
+
+    def get_profile_picture_url(self, user_name):
+        """
+        Use Selenium, to get a What's App account profile picture URL.
+        :param user_name: string - phone number or name of the user's conversation
+        :return: dict - success of the process, and profile picture URL
+        """
+
+        # Check if WhatsApp Web has been opened and logged in
+        if self.driver is None:
+            return self.error or {
+                "success": False,
+                "error": "whatsapp_not_logged_in",
+            }
+
+        try:
+
+            # Limit for the number of search attempts
+            max_attempts = WHATSAPP_MAX_ATTEMPTS
+            attempts = 0
+
+            # Declare Selenium var
+            driver = self.driver
+
+            # Waits return as soon as their condition is met (checked every 0.1 second), or raise TimeoutException
+            # (elements replaced while WhatsApp re-renders them are looked up again at the next check)
+            wait = WebDriverWait(driver, WHATSAPP_WAIT_TIMEOUT, poll_frequency=0.1, ignored_exceptions=[StaleElementReferenceException])
+            search_wait = WebDriverWait(driver, WHATSAPP_SEARCH_TIMEOUT, poll_frequency=0.1)
+
+            while attempts < max_attempts:
+                try:
+
+                    # Search for the user's conversation using their phone number
+                    search_box = wait.until(expected_conditions.element_to_be_clickable(
+                        (By.XPATH, '//div[@title="Champ de recherche"]')
+                    ))
+
+                    # Clear the search field
+                    search_box.clear()
+
+                    # Enter the username in the search field
+                    search_box.send_keys(user_name)
+
+                    # Wait for the results to load, then find the conversation, and click on it
+                    conversation = search_wait.until(expected_conditions.element_to_be_clickable(
+                        (By.XPATH, '//span[@title="' + user_name + '"]')
+                    ))
+                    conversation.click()
+
+                    # Wait for the conversation to load, then find the element containing the profile details, and click on it
+                    profile_container = wait.until(expected_conditions.element_to_be_clickable(
+                        (By.XPATH, '//div[@title="Détails du profil"]')
+                    ))
+                    profile_container.click()
+
+                    # Wait for the profile to load, then retrieve the URL of the profile picture, as soon as its source
+                    # is set (the element is looked up at each check, as WhatsApp may re-render it meanwhile)
+                    def get_photo_url(_):
+                        profile_photo = driver.find_element(By.XPATH, '//div[@class="_aigv _aig-"]//section//img')
+                        return profile_photo.is_displayed() and profile_photo.get_attribute('src')
+
+                    photo_url = wait.until(get_photo_url)
+
+                    # Close the browser
+                    # driver.quit()
+
+                    return {
+                        "success": True,
+                        "error": None,
+                        "url": photo_url,
+                    }
+
+                except (NoSuchElementException, StaleElementReferenceException, TimeoutException):
+
+                    # TODO : Check if the user hasn't logged into their account
+                    # try:
+                    #     # Try to find the element
+                    #     element = driver.find_element(By.CLASS_NAME, 'vsc-initialized')
+                    # except NoSuchElementException:
+                    #     # If the element is not found, that mean there is a problem with page loading
+                    #     raise Exception("page is not loaded correctly")
+
+                    # If no conversation found, reset the search input
+                    reset_search_box_button = driver.find_element(By.XPATH, '//button[@aria-label="Annuler la recherche"]')
+                    reset_search_box_button.click()
+
+                    # Increase attempt, and retry process
+                    attempts += 1
+
+            # If no conversation is found after a certain number of attempts, display an error message
+            raise Exception(f"No conversation found after {max_attempts} attempts for this user.")
+            # driver.quit()
+
+        except Exception as err:
+            return {
+                "success": False,
+                "error": str(err),
+            }
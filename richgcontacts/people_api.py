@@ -1,7 +1,9 @@
 from __future__ import print_function
 
 import base64
+import json
 import os.path
+import threading
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -10,6 +12,8 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from richgcontacts.globals import *
+from richgcontacts.metrics import Metrics
+from richgcontacts.photo_optimizer import PhotoOptimizer
 
 
 class PeopleApi:
@@ -18,6 +22,8 @@ class PeopleApi:
 
     Attributes
     ----------
+    account : string|None
+        name of the synchronized Google account, None for the default one
     creds : object from google.oauth2.credentials
         token to connect to the api
     SCOPES : string
@@ -26,11 +32,32 @@ class PeopleApi:
         show https://developers.google.com/identity/protocols/oauth2/scopes for more details
     token_path : string
         path to token file
-        unique for a connected user
+        unique for a connected user: 'data/token.json' for the default account, in 'data/accounts/<account>/' else
     credentials_path : string
         path to credentials file
         used for access Google People API
         read the README for more details
+    sync_token_path : string
+        path to sync token file, stored next to the token file
+        used by incremental listings, to get only contacts changed since the last run
+    upload_ledger_path : string
+        path to upload ledger file, stored next to the token file
+        used to skip uploads of photos unchanged since the last run
+    next_sync_token : dict|None
+        sync token received by the last complete listing, waiting to be saved by save_sync_token()
+    pending_photos : dict
+        queued photo updates, by resource name, waiting to be sent by flush_contact_updates()
+    pending_fields : dict
+        queued field updates, by resource name, waiting to be sent by flush_contact_updates()
+    flushed_results : dict
+        results of updates already sent, by resource name, waiting to be returned by flush_contact_updates()
+    photo_optimizer : PhotoOptimizer
+        crop, downsize and re-encode images before their upload
+    on_update : function|None
+        called with the resource name, the kind ('fields' or 'photo') and the success of each sent update, as soon as
+        its batch is answered (ex: to journal uploads before the end of the run)
+    lock : threading.RLock
+        the API client is not thread-safe: calls and update queues are protected by this lock
     service : googleapiclient object
         use to call the API
 
@@ -38,25 +65,76 @@ class PeopleApi:
     -------
     connect_api()
         Try to connect user to the api.
-    get_contacts()
-        Get contacts for a connected user.
+    get_contacts(person_fields, page_size, incremental)
+        Get contacts for a connected user, page by page.
+    is_expired_sync_token_error(err)
+        Check if an API error is returned because of an expired sync token.
+    load_sync_token(person_fields)
+        Return the saved sync token, if it has been requested with the same person fields.
+    save_sync_token()
+        Save the sync token received by the last complete listing.
+    delete_sync_token()
+        Delete the saved sync token, so the next listing will be a full one.
     update_contact_photo(image_path, resource_name)
         Update contact profile picture.
+    encode_photo(image_path)
+        Return the base64 content of an image, as expected by updateContactPhoto.
+    queue_contact_photo(image_path, resource_name, digest)
+        Queue a contact profile picture update.
+    queue_contact_fields(resource_name, etag, fields)
+        Queue a contact fields update.
+    flush_contact_updates()
+        Send all queued updates as batched requests, and return results by resource name.
+    flush_field_updates()
+        Send queued fields updates, with batchUpdateContacts calls.
+    flush_photo_updates()
+        Send queued photos updates, with HTTP batch requests of updateContactPhoto calls.
+    add_flushed_result(resource_name, kind, success, error, api_result, etag)
+        Store the result of an update, merged with a previous result for the same contact.
     """
 
-    def __init__(self):
+    # Maximum page size allowed by connections().list()
+    PAGE_SIZE = 1000
+
+    # Person fields requested by default
+    PERSON_FIELDS = 'names,photos,imClients,birthdays'
+
+    # Maximum number of updateContactPhoto calls sent in a single HTTP batch request
+    PHOTO_BATCH_SIZE = 50
+
+    # Maximum number of contacts updated by a single batchUpdateContacts call
+    FIELDS_BATCH_SIZE = 200
+
+    def __init__(self, account=None):
         """
         Try connecting the Google People API.
+        :param account: string|None - name of the Google account, each one having its own token (None for the default one)
         :return: dict - contains 'api' and 'connections'
         """
 
         # Init var
+        self.account = account
         self.creds = None
         self.SCOPES = ['https://www.googleapis.com/auth/contacts']
 
-        # Set paths
-        self.token_path = os.path.join(root, f'data/token.json')
+        # Set paths (credentials of the Google Cloud project are shared by all accounts)
+        account_path = os.path.join(root, 'data/') if account is None else os.path.join(root, f'data/accounts/{account}/')
+        os.makedirs(account_path, exist_ok=True)
+        self.token_path = os.path.join(account_path, 'token.json')
         self.credentials_path = os.path.join(root, f'data/credentials.json')
+        self.sync_token_path = os.path.join(account_path, 'sync_token.json')
+        self.upload_ledger_path = os.path.join(account_path, 'upload_ledger.json')
+        self.next_sync_token = None
+
+        # Init update queues
+        self.pending_photos = {}
+        self.pending_fields = {}
+        self.flushed_results = {}
+        self.on_update = None
+        self.lock = threading.RLock()
+
+        # Init upload images preparation
+        self.photo_optimizer = PhotoOptimizer()
 
         # Check credentials, and connect user to API
         self.service = None
@@ -105,6 +183,8 @@ class PeopleApi:
             else:
 
                 # Init user login
+                if self.account is not None:
+                    print(f'Log in the Google account "{self.account}"...')
                 flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.SCOPES)
                 self.creds = flow.run_local_server(port=0)
 
@@ -119,28 +199,135 @@ class PeopleApi:
         # Prepare API
         self.service = build('people', 'v1', credentials=self.creds)
 
-    def get_contacts(self):
+    def get_contacts(self, person_fields=PERSON_FIELDS, page_size=PAGE_SIZE, incremental=False, exit_on_error=True):
         """
-        Get contacts for a connected user.
-        :return: array
+        Get contacts for a connected user, page by page.
+        Contacts are yielded as soon as their page is received, so the caller can start processing them before
+        the whole listing is done.
+        A sync token is always requested. Once the listing is complete, call save_sync_token() to keep it.
+        In incremental mode, the saved sync token is used to get only contacts added, changed or deleted since it has
+        been saved (deleted contacts have 'metadata.deleted' set to True). If there is no usable token, or if it has
+        expired, a full listing is done instead.
+        :param person_fields: string - comma separated person fields to request (ex: 'names,photos')
+        :param page_size: int - number of contacts per page (max 1000)
+        :param incremental: bool - use the saved sync token, if any
+        :param exit_on_error: bool - exit on API HTTP errors, else raise them (ex: to retry later)
+        :return: generator - yield each contact returned by the API
         """
 
+        # Get the saved sync token, if wanted
+        sync_token = self.load_sync_token(person_fields) if incremental else None
+
+        page_token = None
+        self.next_sync_token = None
+
         try:
 
-            # Do the call
-            results = self.service.people().connections().list(
-                resourceName='people/me',
-                # pageSize=10,
-                sortOrder='LAST_MODIFIED_DESCENDING',
-                personFields='names,photos,imClients'
-            ).execute()
+            while True:
+
+                # Prepare the call, for the next page
+                params = {
+                    "resourceName": 'people/me',
+                    "pageSize": page_size,
+                    "pageToken": page_token,
+                    "sortOrder": 'LAST_MODIFIED_DESCENDING',
+                    "personFields": person_fields,
+                    "requestSyncToken": True,
+                }
+                if sync_token:
+                    params["syncToken"] = sync_token
 
-            # Return contacts
-            return results.get('connections', [])
+                try:
+                    with self.lock, Metrics.get_current().span('list'):
+                        results = self.service.people().connections().list(**params).execute()
+
+                except HttpError as err:
+
+                    # If the sync token has expired, before the first page: restart with a full listing
+                    if sync_token and page_token is None and self.is_expired_sync_token_error(err):
+                        print('    \u001b[33mWarning: sync token has expired, all contacts will be listed.\u001b[0m')
+                        self.delete_sync_token()
+                        sync_token = None
+                        continue
+
+                    raise
+
+                # Yield contacts of this page
+                Metrics.get_current().count('contacts_listed', len(results.get('connections', [])))
+                for person in results.get('connections', []):
+                    yield person
+
+                # Stop when there is no more page, and keep the new sync token
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    if results.get('nextSyncToken'):
+                        self.next_sync_token = {
+                            "sync_token": results['nextSyncToken'],
+                            "person_fields": person_fields,
+                        }
+                    return
 
         except HttpError as err:
+            if not exit_on_error:
+                raise
             exit(f'API HTTP error: {err}')
 
+    @staticmethod
+    def is_expired_sync_token_error(err):
+        """
+        Check if an API error is returned because of an expired sync token.
+        :param err: HttpError
+        :return: bool
+        """
+
+        return err.resp.status == 410 or 'EXPIRED_SYNC_TOKEN' in str(err)
+
+    def load_sync_token(self, person_fields):
+        """
+        Return the saved sync token, if it has been requested with the same person fields.
+        :param person_fields: string - person fields of the listing to do
+        :return: string|None
+        """
+
+        if not os.path.exists(self.sync_token_path):
+            return None
+
+        try:
+            with open(self.sync_token_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        # A sync token can only be used with the same request parameters
+        if data.get('person_fields') != person_fields:
+            return None
+
+        return data.get('sync_token')
+
+    def save_sync_token(self):
+        """
+        Save the sync token received by the last complete listing.
+        Call it once all listed contacts have been processed, so an interrupted run doesn't skip any contact.
+        :return: bool - True if a token has been saved
+        """
+
+        if self.next_sync_token is None:
+            return False
+
+        with open(self.sync_token_path, 'w') as file:
+            json.dump(self.next_sync_token, file)
+
+        return True
+
+    def delete_sync_token(self):
+        """
+        Delete the saved sync token, so the next listing will be a full one.
+        :return: void
+        """
+
+        if os.path.exists(self.sync_token_path):
+            os.remove(self.sync_token_path)
+
     def update_contact_photo(self, image_path, resource_name):
         """
         Update contact profile picture.
@@ -149,19 +336,19 @@ class PeopleApi:
         :return: array
         """
 
-        # Convert picture to use, into bytes format
-        with open(image_path, "rb") as image:
-            photo_bytes = base64.b64encode(image.read())
+        # Make the image smaller, before its upload
+        image_path = self.photo_optimizer.optimize(image_path)
 
         # Update actual picture with this new picture
         try:
-            results = self.service.people().updateContactPhoto(
-                resourceName=resource_name,
-                body={
-                    "photoBytes": photo_bytes.decode('utf-8'),
-                    "personFields": "names,photos,imClients"
-                }
-            ).execute()
+            with self.lock:
+                results = self.service.people().updateContactPhoto(
+                    resourceName=resource_name,
+                    body={
+                        "photoBytes": self.encode_photo(image_path),
+                        "personFields": "names,photos,imClients"
+                    }
+                ).execute()
 
             # Return updated results
             return {
@@ -176,3 +363,200 @@ class PeopleApi:
                 "error": str(err),
                 "api_result": [{"displayName": resource_name}],
             }
+
+    @staticmethod
+    def encode_photo(image_path):
+        """
+        Return the base64 content of an image, as expected by updateContactPhoto.
+        :param image_path: string - image to encode
+        :return: string
+        """
+
+        # Convert picture to use, into bytes format
+        with open(image_path, "rb") as image:
+            return base64.b64encode(image.read()).decode('utf-8')
+
+    def queue_contact_photo(self, image_path, resource_name, digest=None):
+        """
+        Queue a contact profile picture update.
+        Queued updates are sent by flush_contact_updates(), or as soon as a full batch is queued (queued fields updates
+        are sent first, so queue fields updates of a contact before its photo).
+        :param image_path: string, image to update
+        :param resource_name: string, returned by People API connections() call. Unique for each contact.
+        :param digest: string|None, hash of the image content (avoid hashing it again to find its optimized variant)
+        :return: void
+        """
+
+        # Make the image smaller, before its upload (outside the lock, so other threads can still queue updates)
+        with Metrics.get_current().span('optimize', contact=resource_name):
+            image_path = self.photo_optimizer.optimize(image_path, digest)
+
+        with self.lock:
+            self.pending_photos[resource_name] = image_path
+
+            # Send a full batch right away, after queued fields updates (a photo update changes the contact etag)
+            if len(self.pending_photos) >= self.PHOTO_BATCH_SIZE:
+                self.flush_field_updates()
+                self.flush_photo_updates()
+
+    def queue_contact_fields(self, resource_name, etag, fields):
+        """
+        Queue a contact fields update.
+        Queued updates are sent by flush_contact_updates(), before photo updates (which would change the etag).
+        :param resource_name: string, returned by People API connections() call. Unique for each contact.
+        :param etag: string, returned by People API connections() call, with the contact
+        :param fields: dict - person fields to update (ex: {"birthdays": [...]})
+        :return: void
+        """
+
+        with self.lock:
+            self.pending_fields[resource_name] = {
+                "etag": etag,
+                "fields": fields,
+            }
+
+    def flush_contact_updates(self):
+        """
+        Send all queued updates as batched requests: fields updates with batchUpdateContacts, then photos updates
+        with an HTTP batch of updateContactPhoto calls.
+        :return: dict - for each updated resource name, a dict with 'success', 'error', 'api_result' and 'etag'
+        """
+
+        with self.lock:
+            self.flush_field_updates()
+            self.flush_photo_updates()
+
+            # Return all results since the last flush
+            results = self.flushed_results
+            self.flushed_results = {}
+
+        return results
+
+    def flush_field_updates(self):
+        """
+        Send queued fields updates, with batchUpdateContacts calls.
+        Contacts are grouped by updated fields, because the update mask is shared by all contacts of a call.
+        :return: void
+        """
+
+        # Group contacts by update mask
+        groups = {}
+        for resource_name, update in self.pending_fields.items():
+            update_mask = ','.join(sorted(update["fields"]))
+            groups.setdefault(update_mask, []).append(resource_name)
+
+        self.pending_fields, pending_fields = {}, self.pending_fields
+
+        for update_mask, resource_names in groups.items():
+            for i in range(0, len(resource_names), self.FIELDS_BATCH_SIZE):
+                chunk = resource_names[i:i + self.FIELDS_BATCH_SIZE]
+
+                # Prepare contacts to update, with their etag
+                contacts = {}
+                for resource_name in chunk:
+                    contacts[resource_name] = dict(pending_fields[resource_name]["fields"], etag=pending_fields[resource_name]["etag"])
+
+                try:
+                    with Metrics.get_current().span('upload_fields'):
+                        results = self.service.people().batchUpdateContacts(
+                            body={
+                                "contacts": contacts,
+                                "updateMask": update_mask,
+                                "readMask": "names",
+                            }
+                        ).execute()
+
+                    for resource_name in chunk:
+                        person = results.get('updateResult', {}).get(resource_name, {}).get('person', {})
+                        self.add_flushed_result(resource_name, 'fields', True, None, person.get('names', []), person.get('etag'))
+
+                except Exception as err:
+
+                    # The whole call has failed: report the error on each contact
+                    for resource_name in chunk:
+                        self.add_flushed_result(resource_name, 'fields', False, str(err), [])
+
+    def flush_photo_updates(self):
+        """
+        Send queued photos updates, with HTTP batch requests of updateContactPhoto calls.
+        :return: void
+        """
+
+        self.pending_photos, pending_photos = {}, self.pending_photos
+        resource_names = list(pending_photos)
+        answered = set()
+
+        def callback(request_id, response, exception):
+            """
+            Store the result of a single call of the batch.
+            :param request_id: string - resource name of the updated contact
+            :param response: dict - API response
+            :param exception: HttpError|None
+            :return: void
+            """
+
+            answered.add(request_id)
+
+            if exception is not None:
+                self.add_flushed_result(request_id, 'photo', False, str(exception), [])
+            else:
+                person = response.get('person', {})
+                self.add_flushed_result(request_id, 'photo', True, None, person.get('names', []), person.get('etag'))
+
+        for i in range(0, len(resource_names), self.PHOTO_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+
+            for resource_name in resource_names[i:i + self.PHOTO_BATCH_SIZE]:
+                try:
+                    body = {
+                        "photoBytes": self.encode_photo(pending_photos[resource_name]),
+                        "personFields": "names,photos,imClients"
+                    }
+                except OSError as err:
+                    answered.add(resource_name)
+                    self.add_flushed_result(resource_name, 'photo', False, str(err), [])
+                    continue
+
+                batch.add(self.service.people().updateContactPhoto(resourceName=resource_name, body=body), request_id=resource_name)
+
+            try:
+                with Metrics.get_current().span('upload_photos'):
+                    batch.execute()
+            except Exception as err:
+
+                # The whole batch has failed: report the error on each contact without result
+                for resource_name in resource_names[i:i + self.PHOTO_BATCH_SIZE]:
+                    if resource_name not in answered:
+                        self.add_flushed_result(resource_name, 'photo', False, str(err), [])
+
+    def add_flushed_result(self, resource_name, kind, success, error, api_result, etag=None):
+        """
+        Store the result of an update, merged with a previous result for the same contact (fields, then photo).
+        :param resource_name: string - updated contact
+        :param kind: string - updated data, 'fields' or 'photo'
+        :param success: bool
+        :param error: string|None
+        :param api_result: list - 'names' of the updated contact
+        :param etag: string|None - etag of the updated contact
+        :return: void
+        """
+
+        Metrics.get_current().count('contact_updates' if success else 'contact_update_errors')
+
+        if self.on_update is not None:
+            self.on_update(resource_name, kind, success)
+
+        previous = self.flushed_results.get(resource_name)
+
+        if previous is not None:
+            success = previous["success"] and success
+            error = '; '.join(e for e in [previous["error"], error] if e) or None
+            api_result = api_result or previous["api_result"]
+            etag = etag or previous["etag"]
+
+        self.flushed_results[resource_name] = {
+            "success": success,
+            "error": error,
+            "api_result": api_result or [{"displayName": resource_name}],
+            "etag": etag,
+        }
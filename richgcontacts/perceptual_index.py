@@ -0,0 +1,156 @@
+from PIL import Image
+
+from richgcontacts.database import Database
+from richgcontacts.globals import *
+
+
+class PerceptualIndex:
+    """
+    Index of perceptual hashes of stored images.
+    A perceptual hash (difference hash, on 64 bits) is computed once per image, from a downscaled decode. The same
+    picture served at different compression levels gives hashes at a small Hamming distance, while its content hash
+    is different.
+    To find close hashes without comparing all of them, each hash is split in bands, indexed in the database: two
+    hashes at a distance lower than the number of bands share at least one identical band.
+
+    Attributes
+    ----------
+    database : Database
+        database containing the index
+
+    Methods
+    -------
+    compute_hash(image_path)
+        Compute the perceptual hash of an image.
+    distance(hash1, hash2)
+        Return the number of different bits between two hashes.
+    get(digest)
+        Return the perceptual hash of a stored image.
+    add(digest, phash)
+        Add the perceptual hash of a stored image to the index.
+    find(phash, threshold)
+        Return stored images with a perceptual hash close to the given one, nearest first.
+    """
+
+    # Width of the downscaled image (height is one pixel less: each bit compares two neighbour pixels)
+    HASH_SIZE = 8
+
+    # Number of bands of each hash, and number of bits of each band
+    BANDS = 4
+    BAND_BITS = 16
+
+    def __init__(self, database=None):
+        """
+        Init the index, creating its table if necessary.
+        :param database: Database|None - database to use, the shared one by default
+        """
+
+        self.database = database or Database.get()
+
+        bands = ', '.join(f'band{i} INTEGER NOT NULL' for i in range(self.BANDS))
+        indexes = '\n'.join(f'CREATE INDEX IF NOT EXISTS phashes_band{i} ON phashes (band{i});' for i in range(self.BANDS))
+
+        self.database.create_tables(f'''
+            CREATE TABLE IF NOT EXISTS phashes (
+                digest TEXT PRIMARY KEY,
+                phash TEXT NOT NULL,
+                {bands}
+            );
+            {indexes}
+        ''')
+
+    @classmethod
+    def compute_hash(cls, image_path):
+        """
+        Compute the perceptual hash of an image.
+        JPEG images are decoded directly at a reduced scale (draft mode), so large pictures are never fully decoded.
+        :param image_path: string - image to hash
+        :return: int - hash on 64 bits
+        """
+
+        with Image.open(image_path) as img:
+            img.draft('L', (cls.HASH_SIZE * 4, cls.HASH_SIZE * 4))
+            small = img.convert('L').resize((cls.HASH_SIZE + 1, cls.HASH_SIZE), Image.BILINEAR)
+            pixels = list(small.getdata())
+
+        # Each bit tells if a pixel is brighter than its right neighbour
+        phash = 0
+        for row in range(cls.HASH_SIZE):
+            for col in range(cls.HASH_SIZE):
+                left = pixels[row * (cls.HASH_SIZE + 1) + col]
+                right = pixels[row * (cls.HASH_SIZE + 1) + col + 1]
+                phash = (phash << 1) | (left > right)
+
+        return phash
+
+    @staticmethod
+    def distance(hash1, hash2):
+        """
+        Return the number of different bits between two hashes (Hamming distance).
+        :param hash1: int
+        :param hash2: int
+        :return: int
+        """
+
+        return bin(hash1 ^ hash2).count('1')
+
+    def get_bands(self, phash):
+        """
+        Split a hash in bands.
+        :param phash: int
+        :return: list - int for each band
+        """
+
+        mask = (1 << self.BAND_BITS) - 1
+
+        return [(phash >> (i * self.BAND_BITS)) & mask for i in range(self.BANDS)]
+
+    def get(self, digest):
+        """
+        Return the perceptual hash of a stored image.
+        :param digest: string - content hash of the image
+        :return: int|None
+        """
+
+        rows = self.database.execute('SELECT phash FROM phashes WHERE digest = ?', (digest,))
+
+        return int(rows[0]["phash"], 16) if len(rows) else None
+
+    def add(self, digest, phash):
+        """
+        Add the perceptual hash of a stored image to the index.
+        :param digest: string - content hash of the image
+        :param phash: int - perceptual hash of the image
+        :return: void
+        """
+
+        columns = ', '.join(f'band{i}' for i in range(self.BANDS))
+        placeholders = ', '.join('?' for _ in range(self.BANDS))
+
+        self.database.execute(
+            f'INSERT OR REPLACE INTO phashes (digest, phash, {columns}) VALUES (?, ?, {placeholders})',
+            (digest, format(phash, '016x'), *self.get_bands(phash))
+        )
+
+    def find(self, phash, threshold=PERCEPTUAL_HASH_THRESHOLD):
+        """
+        Return stored images with a perceptual hash close to the given one, nearest first.
+        If threshold is lower than the number of bands, only images sharing a band are compared, else all images are.
+        :param phash: int - perceptual hash to search
+        :param threshold: int - maximum number of different bits
+        :return: list - tuples (digest, distance)
+        """
+
+        if threshold < self.BANDS:
+            where = ' OR '.join(f'band{i} = ?' for i in range(self.BANDS))
+            rows = self.database.execute(f'SELECT digest, phash FROM phashes WHERE {where}', tuple(self.get_bands(phash)))
+        else:
+            rows = self.database.execute('SELECT digest, phash FROM phashes')
+
+        matches = []
+        for row in rows:
+            distance = self.distance(phash, int(row["phash"], 16))
+            if distance <= threshold:
+                matches.append((row["digest"], distance))
+
+        return sorted(matches, key=lambda match: match[1])
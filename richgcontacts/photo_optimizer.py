@@ -0,0 +1,129 @@
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+from richgcontacts.globals import *
+from richgcontacts.image_store import ImageStore
+
+
+class PhotoOptimizer:
+    """
+    Prepare images before their upload as contact photos.
+    Google crops and downsizes contact photos anyway: images are rotated upright (re-encoding drops their EXIF
+    orientation), cropped to a centered square, downsized to a maximum size, and re-encoded as JPEG, so uploads are
+    much smaller. The optimized variant of an image is kept on disk, named
+    by the hash of the source image and the optimization settings, so it's computed only one time.
+
+    Attributes
+    ----------
+    path : string
+        folder containing optimized images
+    max_size : int
+        maximum width and height of optimized images, in pixels
+    quality : int
+        JPEG quality of optimized images
+
+    Methods
+    -------
+    optimize(image_path, digest)
+        Return the path of the optimized variant of an image, creating it if necessary.
+    get_optimized_path(digest)
+        Return the path of the optimized variant of an image.
+    create_optimized(image_path, optimized_path)
+        Crop, downsize and re-encode an image.
+    """
+
+    # Version of the optimization steps, part of variants names (variants of previous versions were not rotated)
+    VERSION = 2
+
+    def __init__(self, path=None, max_size=UPLOAD_PHOTO_MAX_SIZE, quality=UPLOAD_PHOTO_QUALITY):
+        """
+        Init the optimizer.
+        :param path: string|None - folder containing optimized images, in the user data folder by default
+        :param max_size: int - maximum width and height of optimized images, in pixels
+        :param quality: int - JPEG quality of optimized images
+        """
+
+        self.path = path or os.path.join(userdata_path, 'upload')
+        self.max_size = max_size
+        self.quality = quality
+
+    def optimize(self, image_path, digest=None):
+        """
+        Return the path of the optimized variant of an image, creating it if necessary.
+        If the image can't be optimized, the source image is returned, so it's uploaded as before.
+        :param image_path: string - source image
+        :param digest: string|None - hash of the source image content, computed if not given
+        :return: string - image path to upload
+        """
+
+        try:
+
+            # Get the hash of the source image
+            if digest is None:
+                digest = ImageStore.hash_file(image_path)
+
+            # Optimize the image only one time
+            optimized_path = self.get_optimized_path(digest)
+            if not os.path.exists(optimized_path):
+                self.create_optimized(image_path, optimized_path)
+
+            # Keep the source image, if it's smaller
+            if os.path.getsize(optimized_path) >= os.path.getsize(image_path):
+                return image_path
+
+            return optimized_path
+
+        except Exception:
+            return image_path
+
+    def get_optimized_path(self, digest):
+        """
+        Return the path of the optimized variant of an image. Settings and version are part of the name, so changing
+        them creates new variants.
+        :param digest: string - hash of the source image content
+        :return: string
+        """
+
+        return os.path.join(self.path, digest[:2], f'{digest}-{self.max_size}-q{self.quality}-v{self.VERSION}.jpg')
+
+    def create_optimized(self, image_path, optimized_path):
+        """
+        Rotate an image upright, crop it to a centered square, downsize it, and re-encode it as JPEG.
+        :param image_path: string - source image
+        :param optimized_path: string - where to write the optimized image
+        :return: void
+        """
+
+        with Image.open(image_path) as img:
+
+            # Decode a JPEG directly at a reduced scale, keeping at least the maximum size on both sides
+            img.draft('RGB', (self.max_size, self.max_size))
+
+            # Apply the EXIF orientation to pixels, before cropping on the right axis
+            img = ImageOps.exif_transpose(img).convert('RGB')
+
+            # Crop to a centered square
+            width, height = img.size
+            side = min(width, height)
+            left = (width - side) // 2
+            top = (height - side) // 2
+            img = img.crop((left, top, left + side, top + side))
+
+            # Downsize to the maximum size
+            if side > self.max_size:
+                img = img.resize((self.max_size, self.max_size), Image.LANCZOS)
+
+            # Write a unique temporary file first, so an interrupted write never leaves a truncated image, and
+            # contacts sharing this image can optimize it concurrently
+            os.makedirs(os.path.dirname(optimized_path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(optimized_path), suffix='.part', delete=False) as f:
+                try:
+                    img.save(f, 'JPEG', quality=self.quality, optimize=True)
+                except BaseException:
+                    f.close()
+                    os.remove(f.name)
+                    raise
+
+            os.replace(f.name, optimized_path)
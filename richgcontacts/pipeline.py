@@ -0,0 +1,278 @@
+import queue
+import threading
+
+from richgcontacts.globals import *
+
+
+class SyncPipeline:
+    """
+    Run the contacts synchronization as concurrent stages, linked by bounded queues:
+    list -> filter -> fetch (one stage per social network) -> choose image -> upload.
+    Stages only call the functions given to the constructor, so the serial path and this pipeline share the same code.
+
+    Attributes
+    ----------
+    filter_contacts : function
+        generator, yield formatted users from an iterable of contacts
+    fetch : function
+        get the profile picture for a network of a user, return a dict with 'image' and 'log'
+    choose : function
+        choose the best image of a user, from its fetch results (None if there is no image)
+    upload : function
+        queue the update of a user from its chosen image (or None) and its fetch results, return the data to keep for
+        the report (or None to keep nothing)
+    on_contact : function|None
+        called once all networks of a user have been fetched (used to print the contact)
+    workers : dict
+        number of workers for each stage (and for each network fetch stage)
+    queue_size : int
+        maximum number of items waiting between two stages
+    queues : dict
+        queue of each stage
+    network_names : set
+        names of network fetch stages
+    threads : dict
+        workers of each stage
+    results : list
+        tuples (index, upload result), index being the position of the user in the listing
+    errors : list
+        exceptions raised by workers
+
+    Methods
+    -------
+    run(connections)
+        Run all stages on contacts, and return upload results in listing order.
+    """
+
+    # Stages which are not a network fetch stage
+    STAGES = ["filter", "choose", "upload"]
+
+    # Marker sent in a queue, to stop one of its workers
+    STOP = None
+
+    def __init__(self, filter_contacts, fetch, choose, upload, on_contact=None, workers=None, queue_size=PIPELINE_QUEUE_SIZE):
+        """
+        Init the pipeline.
+        :param filter_contacts: function - generator, yield formatted users from an iterable of contacts
+        :param fetch: function - get the profile picture for a network of a user
+        :param choose: function - choose the best image of a user, from its fetch results
+        :param upload: function - queue the update of a user from its chosen image (or None) and its fetch results,
+        return the data to keep for the report (or None)
+        :param on_contact: function|None - called once all networks of a user have been fetched
+        :param workers: dict|None - number of workers by stage, overriding PIPELINE_WORKERS
+        :param queue_size: int - maximum number of items waiting between two stages
+        """
+
+        self.filter_contacts = filter_contacts
+        self.fetch = fetch
+        self.choose = choose
+        self.upload = upload
+        self.on_contact = on_contact
+        self.workers = dict(PIPELINE_WORKERS, **(workers or {}))
+        self.queue_size = queue_size
+
+        self.queues = {}
+        self.network_names = set()
+        self.threads = {}
+        self.results = []
+        self.errors = []
+
+        self.count = 0
+        self.lock = threading.Lock()
+        self.print_lock = threading.Lock()
+
+    def run(self, connections):
+        """
+        Run all stages on contacts, and return upload results in listing order.
+        :param connections: iterable - contacts yielded by PeopleApi.get_contacts()
+        :return: list - upload results
+        """
+
+        network_names = [name for name in self.workers if name not in self.STAGES]
+        self.network_names = set(network_names)
+
+        # Create a bounded queue for each stage
+        for name in self.STAGES + network_names:
+            self.queues[name] = queue.Queue(maxsize=self.queue_size)
+
+        # Start workers, the listing being done by its own thread
+        self.start('list', 1, self.list_stage, connections)
+        self.start('filter', self.workers["filter"], self.filter_stage)
+        for name in network_names:
+            self.start(name, self.workers[name], self.fetch_stage, name)
+        self.start('choose', self.workers["choose"], self.choose_stage)
+        self.start('upload', self.workers["upload"], self.upload_stage)
+
+        # Stop each stage once all stages before it have finished
+        self.join('list')
+        self.stop('filter')
+        self.join('filter')
+        for name in network_names:
+            self.stop(name)
+        for name in network_names:
+            self.join(name)
+        self.stop('choose')
+        self.join('choose')
+        self.stop('upload')
+        self.join('upload')
+
+        # Raise the first error of a worker, in the calling thread
+        if self.errors:
+            raise self.errors[0]
+
+        # Return results in the same order as the serial path
+        return [result for index, result in sorted(self.results, key=lambda item: item[0]) if result is not None]
+
+    def start(self, name, count, target, *args):
+        """
+        Start workers of a stage.
+        :param name: string - stage name
+        :param count: int - number of workers
+        :param target: function - worker function
+        :return: void
+        """
+
+        def worker():
+            try:
+                target(*args)
+            except BaseException as err:
+                self.errors.append(err)
+
+                # Keep consuming items, so previous stages are never blocked on a full queue
+                if name in self.queues:
+                    for _ in self.iter_queue(name):
+                        pass
+
+        self.threads[name] = [threading.Thread(target=worker, name=f'sync-{name}-{i}', daemon=True) for i in range(max(1, count))]
+        for thread in self.threads[name]:
+            thread.start()
+
+    def stop(self, name):
+        """
+        Send a stop marker to each worker of a stage.
+        :param name: string - stage name
+        :return: void
+        """
+
+        for _ in self.threads[name]:
+            self.queues[name].put(self.STOP)
+
+    def join(self, name):
+        """
+        Wait for all workers of a stage.
+        :param name: string - stage name
+        :return: void
+        """
+
+        for thread in self.threads[name]:
+            thread.join()
+
+    def iter_queue(self, name):
+        """
+        Yield items of a stage queue, until a stop marker is received.
+        :param name: string - stage name
+        :return: generator
+        """
+
+        while True:
+            item = self.queues[name].get()
+            if item is self.STOP:
+                return
+            yield item
+
+    def list_stage(self, connections):
+        """
+        List contacts, and send them to the filter stage.
+        :param connections: iterable - contacts yielded by PeopleApi.get_contacts()
+        :return: void
+        """
+
+        for person in connections:
+
+            # Stop listing if a worker has failed
+            if self.errors:
+                return
+
+            self.queues["filter"].put(person)
+
+    def filter_stage(self):
+        """
+        Filter contacts, and send each network of each user to its fetch stage.
+        :return: void
+        """
+
+        for user in self.filter_contacts(self.iter_queue('filter')):
+
+            # Keep the listing position of the user
+            with self.lock:
+                index = self.count
+                self.count += 1
+
+            job = {
+                "index": index,
+                "user": user,
+                "fetched": [None] * len(user["networks"]),
+                "remaining": len(user["networks"]),
+            }
+
+            for i, network in enumerate(user["networks"]):
+
+                # Networks without fetch stage (not managed, or named like another stage) are handled right away
+                if network["network_name"] in self.network_names:
+                    self.queues[network["network_name"]].put((job, i))
+                else:
+                    self.fetched(job, i, self.fetch(network))
+
+    def fetch_stage(self, network_name):
+        """
+        Get profile pictures for a social network.
+        :param network_name: string - network of this stage
+        :return: void
+        """
+
+        for job, i in self.iter_queue(network_name):
+            self.fetched(job, i, self.fetch(job["user"]["networks"][i]))
+
+    def fetched(self, job, i, result):
+        """
+        Store the fetch result of a network, and send the user to the choose stage once all its networks are fetched.
+        :param job: dict - user being processed
+        :param i: int - network position in user networks
+        :param result: dict - returned by fetch function
+        :return: void
+        """
+
+        with self.lock:
+            job["fetched"][i] = result
+            job["remaining"] -= 1
+            is_done = job["remaining"] == 0
+
+        if is_done:
+            if self.on_contact is not None:
+                with self.print_lock:
+                    self.on_contact(job["user"], job["fetched"])
+
+            self.queues["choose"].put(job)
+
+    def choose_stage(self):
+        """
+        Choose the best image of each user, and send it to the upload stage (users without image too, as other
+        fetched data may be updated).
+        :return: void
+        """
+
+        for job in self.iter_queue('choose'):
+            job["choosen_image"] = self.choose(job["user"], job["fetched"])
+            self.queues["upload"].put(job)
+
+    def upload_stage(self):
+        """
+        Queue the update of each user.
+        :return: void
+        """
+
+        for job in self.iter_queue('upload'):
+            result = self.upload(job["user"], job["choosen_image"], job["fetched"])
+
+            with self.lock:
+                self.results.append((job["index"], result))
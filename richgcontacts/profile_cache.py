@@ -0,0 +1,112 @@
+import json
+import time
+
+from richgcontacts.database import Database
+from richgcontacts.globals import *
+
+
+class ProfileCache:
+    """
+    Persistent cache of social network profile lookups.
+    For each network and user name, it keeps the resolved profile picture URL, the birthday found on the profile, and
+    the lookup date. While the entry is younger than the network TTL, the expensive profile lookup is skipped, and the
+    picture is only revalidated.
+
+    Attributes
+    ----------
+    database : Database
+        database containing the cache
+    ttl : dict
+        time to live of entries, in seconds, for each network (0 to disable the cache)
+
+    Methods
+    -------
+    get(network_name, user_name)
+        Return the cached lookup result, if the entry is still valid.
+    set(network_name, user_name, url, birthday)
+        Cache the lookup result of a user.
+    delete(network_name, user_name)
+        Remove a user from the cache (ex: cached URL has expired).
+    """
+
+    def __init__(self, database=None, ttl=None):
+        """
+        Init the cache, creating its table if necessary.
+        :param database: Database|None - database to use, the shared one by default
+        :param ttl: dict|None - time to live of entries by network, overriding PROFILE_CACHE_TTL
+        """
+
+        self.database = database or Database.get()
+        self.ttl = dict(PROFILE_CACHE_TTL, **(ttl or {}))
+
+        self.database.create_tables('''
+            CREATE TABLE IF NOT EXISTS profile_lookups (
+                network_name TEXT NOT NULL,
+                user_name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                birthday TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (network_name, user_name)
+            );
+        ''')
+
+        # Add the birthday column to tables created by previous versions
+        columns = [row["name"] for row in self.database.execute('PRAGMA table_info(profile_lookups)')]
+        if 'birthday' not in columns:
+            self.database.execute('ALTER TABLE profile_lookups ADD COLUMN birthday TEXT')
+
+    def get(self, network_name, user_name):
+        """
+        Return the cached lookup result, if the entry is still valid.
+        :param network_name: string
+        :param user_name: string
+        :return: dict|None - contain 'url' and 'birthday' (dict or None), or None if there is no valid entry
+        """
+
+        ttl = self.ttl.get(network_name, 0)
+        if ttl <= 0:
+            return None
+
+        rows = self.database.execute(
+            'SELECT url, birthday FROM profile_lookups WHERE network_name = ? AND user_name = ? AND fetched_at > ?',
+            (network_name, user_name, time.time() - ttl)
+        )
+
+        if not len(rows):
+            return None
+
+        return {
+            "url": rows[0]["url"],
+            "birthday": json.loads(rows[0]["birthday"]) if rows[0]["birthday"] else None,
+        }
+
+    def set(self, network_name, user_name, url, birthday=None):
+        """
+        Cache the lookup result of a user.
+        :param network_name: string
+        :param user_name: string
+        :param url: string - resolved profile picture URL
+        :param birthday: dict|None - birthday found on the profile, with 'month', 'day' and optionally 'year'
+        :return: void
+        """
+
+        if self.ttl.get(network_name, 0) <= 0:
+            return
+
+        self.database.execute(
+            'INSERT OR REPLACE INTO profile_lookups (network_name, user_name, url, birthday, fetched_at) VALUES (?, ?, ?, ?, ?)',
+            (network_name, user_name, url, json.dumps(birthday) if birthday else None, time.time())
+        )
+
+    def delete(self, network_name, user_name):
+        """
+        Remove a user from the cache (ex: cached URL has expired).
+        :param network_name: string
+        :param user_name: string
+        :return: void
+        """
+
+        self.database.execute(
+            'DELETE FROM profile_lookups WHERE network_name = ? AND user_name = ?',
+            (network_name, user_name)
+        )
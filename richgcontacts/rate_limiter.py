@@ -0,0 +1,103 @@
+import threading
+import time
+
+from richgcontacts.globals import *
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the requests rate on a social network.
+    The bucket holds up to 'burst' tokens, refilled at 'rate' tokens per second, and each profile lookup takes one
+    token. Tokens are reserved in order, so the waiting time is known as soon as it's reserved: threads sleep, and
+    coroutines can await it without holding a thread.
+    When the network answers that we are rate limited, the whole bucket is paused with an exponential backoff.
+
+    Attributes
+    ----------
+    rate : float|None
+        tokens added per second (None to disable the limit)
+    burst : int
+        maximum number of tokens, consumed without waiting after an idle period
+    next_time : float
+        time at which the next token will be available, without burst
+    lock : threading.Lock
+        protect next_time, when lookups are done concurrently
+
+    Methods
+    -------
+    reserve()
+        Take a token, and return the time to wait before using it.
+    acquire()
+        Take a token, waiting until it's available.
+    backoff(attempt)
+        Pause the bucket after a rate limit answer, and return the pause duration.
+    get_interval()
+        Return the time between two tokens.
+    """
+
+    def __init__(self, rate=None, burst=1, backoff=RATE_LIMIT_BACKOFF, max_backoff=RATE_LIMIT_MAX_BACKOFF):
+        """
+        Init the bucket, full.
+        :param rate: float|None - tokens added per second (None to disable the limit)
+        :param burst: int - maximum number of tokens
+        :param backoff: float - first pause after a rate limit answer, in seconds (doubled on each retry)
+        :param max_backoff: float - maximum pause, in seconds
+        """
+
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.backoff_delay = backoff
+        self.max_backoff = max_backoff
+
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token, and return the time to wait before using it.
+        :return: float - seconds to wait (0 if a token is available)
+        """
+
+        interval = self.get_interval()
+
+        with self.lock:
+            now = time.monotonic()
+
+            # A full bucket allows 'burst' tokens before next_time
+            next_time = max(self.next_time, now)
+            wait = max(0.0, next_time - (self.burst - 1) * interval - now)
+            self.next_time = next_time + interval
+
+        return wait
+
+    def acquire(self):
+        """
+        Take a token, waiting until it's available.
+        :return: void
+        """
+
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff(self, attempt):
+        """
+        Pause the bucket after a rate limit answer: no token is available before the end of the pause.
+        :param attempt: int - number of previous retries for this lookup (0 for the first one)
+        :return: float - pause duration, in seconds
+        """
+
+        delay = min(self.backoff_delay * 2 ** attempt, self.max_backoff)
+
+        with self.lock:
+            self.next_time = max(self.next_time, time.monotonic() + delay + (self.burst - 1) * self.get_interval())
+
+        return delay
+
+    def get_interval(self):
+        """
+        Return the time between two tokens.
+        :return: float - seconds (0 without limit)
+        """
+
+        return 1.0 / self.rate if self.rate else 0.0
@@ -0,0 +1,205 @@
+import random
+import time
+
+from richgcontacts.database import Database
+from richgcontacts.globals import *
+from richgcontacts.image_store import ImageStore
+from richgcontacts.social import Social
+
+
+class RefreshScheduler:
+    """
+    Schedule of social network profiles refreshes, for the daemon mode.
+    Each profile is checked again after an interval based on its change history in the image store: profiles whose
+    picture changes often are checked often, stable ones rarely. A random jitter is added to each interval, and first
+    checks are spread over a time window, so checks are spread over time instead of happening all at once.
+
+    Attributes
+    ----------
+    database : Database
+        database containing the schedule
+    store : ImageStore
+        image store, containing histories of profiles
+    min_interval : float
+        minimum time between two checks of a profile, in seconds
+    max_interval : float
+        maximum time between two checks of a profile, in seconds
+    factor : float
+        part of the mean time between two changes of a profile, used as its check interval
+    jitter : float
+        maximum random variation of intervals (ex: 0.1 for +/- 10%)
+    first_spread : float
+        time window over which first checks of new profiles are spread, in seconds
+
+    Methods
+    -------
+    add(network_name, user_name, now)
+        Schedule the first check of a profile, if it's not scheduled yet.
+    delete(network_name, user_name)
+        Remove a profile from the schedule.
+    get_due(now, limit)
+        Return profiles whose check is due, oldest first.
+    get_next_time()
+        Return the time of the next scheduled check.
+    is_checked(network_name, user_name)
+        Return True if a profile has been checked at least once.
+    record_check(network_name, user_name, now)
+        Schedule the next check of a profile, after it has been checked.
+    get_interval(network_name, user_name, first_checked_at, now)
+        Return the time to wait before the next check of a profile.
+    """
+
+    def __init__(self, database=None, store=None, min_interval=REFRESH_MIN_INTERVAL, max_interval=REFRESH_MAX_INTERVAL,
+                 factor=REFRESH_INTERVAL_FACTOR, jitter=REFRESH_JITTER, first_spread=REFRESH_FIRST_SPREAD):
+        """
+        Init the schedule, creating its table if necessary.
+        :param database: Database|None - database to use, the shared one by default
+        :param store: ImageStore|None - image store containing histories, the shared one by default
+        :param min_interval: float - minimum time between two checks of a profile, in seconds
+        :param max_interval: float - maximum time between two checks of a profile, in seconds
+        :param factor: float - part of the mean time between two changes of a profile, used as its check interval
+        :param jitter: float - maximum random variation of intervals
+        :param first_spread: float - time window over which first checks of new profiles are spread, in seconds
+        """
+
+        self.database = database or Database.get()
+        self.store = store or Social.get_store()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.first_spread = first_spread
+
+        self.database.create_tables('''
+            CREATE TABLE IF NOT EXISTS refresh_schedule (
+                network_name TEXT NOT NULL,
+                user_name TEXT NOT NULL,
+                first_checked_at REAL,
+                checked_at REAL,
+                next_check_at REAL NOT NULL,
+                PRIMARY KEY (network_name, user_name)
+            );
+            CREATE INDEX IF NOT EXISTS refresh_schedule_next ON refresh_schedule (next_check_at);
+        ''')
+
+    def add(self, network_name, user_name, now=None):
+        """
+        Schedule the first check of a profile, if it's not scheduled yet. First checks are spread over a time window.
+        :param network_name: string
+        :param user_name: string
+        :param now: float|None - current timestamp
+        :return: void
+        """
+
+        now = now if now is not None else time.time()
+
+        self.database.execute(
+            'INSERT OR IGNORE INTO refresh_schedule (network_name, user_name, next_check_at) VALUES (?, ?, ?)',
+            (network_name, user_name, now + random.uniform(0, self.first_spread))
+        )
+
+    def delete(self, network_name, user_name):
+        """
+        Remove a profile from the schedule (ex: no contact uses it anymore).
+        :param network_name: string
+        :param user_name: string
+        :return: void
+        """
+
+        self.database.execute(
+            'DELETE FROM refresh_schedule WHERE network_name = ? AND user_name = ?',
+            (network_name, user_name)
+        )
+
+    def get_due(self, now=None, limit=DAEMON_BATCH_SIZE):
+        """
+        Return profiles whose check is due, oldest first.
+        :param now: float|None - current timestamp
+        :param limit: int - maximum number of profiles
+        :return: list - tuples (network_name, user_name)
+        """
+
+        now = now if now is not None else time.time()
+
+        rows = self.database.execute(
+            'SELECT network_name, user_name FROM refresh_schedule WHERE next_check_at <= ? ORDER BY next_check_at LIMIT ?',
+            (now, limit)
+        )
+
+        return [(row["network_name"], row["user_name"]) for row in rows]
+
+    def get_next_time(self):
+        """
+        Return the time of the next scheduled check.
+        :return: float|None - timestamp, or None if no profile is scheduled
+        """
+
+        rows = self.database.execute('SELECT MIN(next_check_at) AS next_check_at FROM refresh_schedule')
+
+        return rows[0]["next_check_at"]
+
+    def is_checked(self, network_name, user_name):
+        """
+        Return True if a profile has been checked at least once.
+        :param network_name: string
+        :param user_name: string
+        :return: bool
+        """
+
+        rows = self.database.execute(
+            'SELECT checked_at FROM refresh_schedule WHERE network_name = ? AND user_name = ?',
+            (network_name, user_name)
+        )
+
+        return len(rows) > 0 and rows[0]["checked_at"] is not None
+
+    def record_check(self, network_name, user_name, now=None):
+        """
+        Schedule the next check of a profile, after it has been checked (the image store history already contains
+        the new picture, if it has changed).
+        :param network_name: string
+        :param user_name: string
+        :param now: float|None - current timestamp
+        :return: float - timestamp of the next check
+        """
+
+        now = now if now is not None else time.time()
+
+        rows = self.database.execute(
+            'SELECT first_checked_at FROM refresh_schedule WHERE network_name = ? AND user_name = ?',
+            (network_name, user_name)
+        )
+        first_checked_at = rows[0]["first_checked_at"] if len(rows) and rows[0]["first_checked_at"] is not None else now
+
+        next_check_at = now + self.get_interval(network_name, user_name, first_checked_at, now)
+
+        self.database.execute(
+            'INSERT OR REPLACE INTO refresh_schedule (network_name, user_name, first_checked_at, checked_at, next_check_at) VALUES (?, ?, ?, ?, ?)',
+            (network_name, user_name, first_checked_at, now, next_check_at)
+        )
+
+        return next_check_at
+
+    def get_interval(self, network_name, user_name, first_checked_at, now):
+        """
+        Return the time to wait before the next check of a profile.
+        The mean time between two changes is estimated from the history dates (the first image of a history has no
+        real date), over the time the profile has been observed. A profile which has never changed gets a longer
+        interval as it's observed longer.
+        :param network_name: string
+        :param user_name: string
+        :param first_checked_at: float - timestamp of the first check by the daemon
+        :param now: float - current timestamp
+        :return: float - seconds
+        """
+
+        history = self.store.get_history(network_name, user_name)
+        change_dates = [entry["date"] for entry in history if entry["date"] > ImageStore.FIRST_DATE.timestamp()]
+
+        # Observed since the first check, or since the first known change if it's older
+        observed_since = min([first_checked_at] + change_dates)
+        mean_interval = (now - observed_since) / (len(change_dates) + 1)
+
+        interval = min(max(mean_interval * self.factor, self.min_interval), self.max_interval)
+
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
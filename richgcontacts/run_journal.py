@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+
+from richgcontacts.database import Database
+from richgcontacts.globals import *
+
+
+class RunJournal:
+    """
+    Journal of the stages completed for each contact by a run, written as they complete.
+    If a run is interrupted (crash, exit() on an API error, killed process), the next run resumes it: stages already
+    completed for a contact are not done again. Once a run has finished, its journal is cleared.
+    Stages are 'fetch:<network>:<user name>' (result of a profile picture fetch) and 'photo' (photo sent to Google,
+    with the hash of the image). Birthdays need no stage: updated birthdays are in the next listing.
+    When a run synchronizes several Google accounts, contacts of each account are journaled under '<account>/'.
+
+    Attributes
+    ----------
+    database : Database
+        database containing the journal
+    run_id : int|None
+        journal of the current run, None until start_run() is called
+    resumed_from : float|None
+        start timestamp of the interrupted run, if the current run resumes it
+    account : string|None
+        Google account whose contacts are being processed, None for the default one
+    entries : dict
+        for each contact key (see get_key()), data of each completed stage
+    pending : dict
+        data of stages started but not completed yet (ex: queued photo updates), by (contact key, stage)
+    lock : threading.Lock
+        protect entries, when contacts are processed concurrently
+
+    Methods
+    -------
+    start_run(max_age)
+        Start the journal of a new run, or resume the journal of an interrupted run.
+    get_current()
+        Return the journal of the current run.
+    use_account(account)
+        Set the Google account whose contacts are processed next.
+    get_key(resource_name)
+        Return the key of a contact in the journal.
+    get(resource_name, stage)
+        Return the data of a stage completed by this run for a contact.
+    record(resource_name, stage, data)
+        Record a stage completed for a contact.
+    queue(resource_name, stage, data)
+        Keep the data of a stage which will complete later (ex: photo update sent with the next batch).
+    complete(resource_name, stage, success)
+        Record a queued stage, if it has succeeded.
+    finish()
+        Mark the run as finished, and clear its journal.
+    """
+
+    # Journal of the current run (replaced on each run)
+    CURRENT = None
+    CURRENT_LOCK = threading.Lock()
+
+    def __init__(self, database=None):
+        """
+        Init the journal, creating its tables if necessary.
+        :param database: Database|None - database to use, the shared one by default
+        """
+
+        self.database = database or Database.get()
+        self.run_id = None
+        self.resumed_from = None
+        self.account = None
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.database.create_tables('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS run_journal (
+                run_id INTEGER NOT NULL,
+                resource_name TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (run_id, resource_name, stage)
+            );
+        ''')
+
+    @classmethod
+    def start_run(cls, max_age=RUN_JOURNAL_MAX_AGE):
+        """
+        Start the journal of a new run, used by all modules until the next run.
+        The last run is resumed if it has not finished, and has started less than max_age seconds ago (older
+        journals are cleared, as fetched pictures may have changed since).
+        :param max_age: float - maximum age of a run to resume, in seconds (0 to never resume)
+        :return: RunJournal
+        """
+
+        journal = cls()
+
+        rows = journal.database.execute('SELECT id, started_at FROM runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1')
+
+        if len(rows) and rows[0]["started_at"] > time.time() - max_age:
+
+            # Resume the interrupted run
+            journal.run_id = rows[0]["id"]
+            journal.resumed_from = rows[0]["started_at"]
+            for row in journal.database.execute('SELECT resource_name, stage, data FROM run_journal WHERE run_id = ?', (journal.run_id,)):
+                journal.entries.setdefault(row["resource_name"], {})[row["stage"]] = json.loads(row["data"])
+
+        else:
+
+            # Forget interrupted runs which can't be resumed, and start a new one
+            journal.database.execute('DELETE FROM run_journal')
+            journal.database.execute('DELETE FROM runs')
+            with journal.database.lock:
+                journal.database.execute('INSERT INTO runs (started_at) VALUES (?)', (time.time(),))
+                journal.run_id = journal.database.execute('SELECT last_insert_rowid() AS id')[0]["id"]
+
+        with cls.CURRENT_LOCK:
+            cls.CURRENT = journal
+
+        return journal
+
+    @classmethod
+    def get_current(cls):
+        """
+        Return the journal of the current run.
+        :return: RunJournal|None - None if no run has been started
+        """
+
+        return cls.CURRENT
+
+    def use_account(self, account):
+        """
+        Set the Google account whose contacts are processed next (resource names are only unique in an account).
+        :param account: string|None - account name, None for the default one
+        :return: void
+        """
+
+        self.account = account
+
+    def get_key(self, resource_name):
+        """
+        Return the key of a contact in the journal, for the current account.
+        :param resource_name: string - contact resource name
+        :return: string - resource name, prefixed by the account name if it's not the default one
+        """
+
+        return resource_name if self.account is None else f'{self.account}/{resource_name}'
+
+    def get(self, resource_name, stage):
+        """
+        Return the data of a stage completed by this run for a contact.
+        :param resource_name: string - contact resource name
+        :param stage: string
+        :return: dict|list|None - None if the stage has not been completed
+        """
+
+        with self.lock:
+            return self.entries.get(self.get_key(resource_name), {}).get(stage)
+
+    def record(self, resource_name, stage, data):
+        """
+        Record a stage completed for a contact. It's written right away, so it's kept if the run is interrupted.
+        :param resource_name: string - contact resource name
+        :param stage: string
+        :param data: dict|list - JSON serializable data, needed to skip this stage
+        :return: void
+        """
+
+        key = self.get_key(resource_name)
+
+        with self.lock:
+            self.entries.setdefault(key, {})[stage] = data
+
+        self.database.execute(
+            'INSERT OR REPLACE INTO run_journal (run_id, resource_name, stage, data) VALUES (?, ?, ?, ?)',
+            (self.run_id, key, stage, json.dumps(data))
+        )
+
+    def queue(self, resource_name, stage, data):
+        """
+        Keep the data of a stage which will complete later (ex: photo update sent with the next batch). It's only kept
+        in memory: if the run is interrupted before the stage completes, it's done again by the next run.
+        :param resource_name: string - contact resource name
+        :param stage: string
+        :param data: dict|list - JSON serializable data, recorded once the stage completes
+        :return: void
+        """
+
+        with self.lock:
+            self.pending[(self.get_key(resource_name), stage)] = data
+
+    def complete(self, resource_name, stage, success=True):
+        """
+        Record a queued stage, if it has succeeded.
+        :param resource_name: string - contact resource name
+        :param stage: string
+        :param success: bool - False if the stage has failed, and must be done again
+        :return: void
+        """
+
+        with self.lock:
+            data = self.pending.pop((self.get_key(resource_name), stage), None)
+
+        if success and data is not None:
+            self.record(resource_name, stage, data)
+
+    def finish(self):
+        """
+        Mark the run as finished, and clear its journal.
+        :return: void
+        """
+
+        self.database.execute('DELETE FROM run_journal WHERE run_id = ?', (self.run_id,))
+        self.database.execute('UPDATE runs SET finished_at = ? WHERE id = ?', (time.time(), self.run_id))
+
+        with self.lock:
+            self.entries = {}
+            self.pending = {}
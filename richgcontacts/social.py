@@ -1,29 +1,13 @@
-import glob
-import sys
-from os.path import exists
-from datetime import datetime
-
-# Instagram
-import instaloader
-from instaloader import Profile, ProfileNotExistsException
-
-# Facebook
-from facebook_scraper import get_profile
-
-# What's App
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
-
-import requests
-from requests import HTTPError
-import warnings
-
-from PIL import Image
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from richgcontacts.globals import *
+from richgcontacts import networks
+from richgcontacts.image_store import ImageStore
+from richgcontacts.metrics import Metrics
+from richgcontacts.profile_cache import ProfileCache
+from richgcontacts.rate_limiter import RateLimiter
 
 
 class Social:
@@ -37,29 +21,64 @@ class Social:
         Name of the network
     user_name : string
         Name of the user, for this network
+    adapter : NetworkAdapter
+        Adapter of the network, wrapping its external package
 
     Methods
     -------
     is_managed(network_name)
         Check if wanted social network is managed.
     download_profile_picture()
-        Redirect to another function, using the network name.
-    download_profile_picture__instagram()
-        Use Instaloader, to get an Instagram profile picture.
-    download_profile_picture__facebook()
-        Use facebook-scraper, to get a Facebook profile picture.
+        Get the profile picture URL, using the network name, then download and store the picture.
+    download_profile_picture_async(semaphore, lookup_semaphore)
+        Asynchronous variant of download_profile_picture().
+    save_lookup(process)
+        Download and store the picture of a profile lookup result.
+    get_cached_profile_picture_url()
+        Return the profile picture URL from the lookups cache, if it's still valid.
+    get_profile_picture_url(use_cache)
+        Get the profile picture URL, from the cache or with a rate limited lookup.
+    get_profile_picture_url_async(lookup_semaphore, use_cache)
+        Asynchronous variant of get_profile_picture_url().
+    lookup_profile_picture_url()
+        Look up the profile picture URL with the network adapter, and cache the found URL.
+    save_profile_picture(photo_url)
+        Download given image URL into the image store, and add it to the user history.
+    save_profile_picture_async(photo_url, semaphore)
+        Asynchronous variant of save_profile_picture().
+    get_executor()
+        Return the executor used by asynchronous methods.
+    get_store()
+        Return the image store, shared by all users and networks.
+    get_profile_cache()
+        Return the profile lookups cache, shared by all users and networks.
+    get_rate_limiter(network_name)
+        Return the rate limiter of a social network.
     get_profile_pictures(get_only_last)
-        Return downloaded image, for a specific user and social network, order by modified date DESC.
+        Return downloaded image, for a specific user and social network, order by date DESC.
+    get_profile_picture_date()
+        Return the date of the last downloaded image, for a specific user and social network.
     delete_duplicated_image()
-        Check if the last downloaded image is identical to the previous one, and delete it if it's true.
+        Check if the last downloaded image is identical to the previous one, and delete it from history if it's true.
     """
 
-    # Managed social networks
-    NETWORKS = ["instagram", "facebook", "whatsapp"]
+    # Managed social networks (their adapter is imported only when a contact uses them)
+    NETWORKS = list(networks.ADAPTERS)
+
+    # Protect shared objects instantiation, when contacts are processed concurrently
+    LOCK = threading.Lock()
+
+    # Executor used by asynchronous methods (instantiated only one time)
+    EXECUTOR = None
+
+    # Image store, shared by all users and networks (instantiated only one time)
+    STORE = None
 
-    # Instantiate external packages (only one time)
-    IG = None
-    WA = None
+    # Profile lookups cache, shared by all users and networks (instantiated only one time)
+    PROFILE_CACHE = None
+
+    # Rate limiter of each social network (instantiated only one time)
+    RATE_LIMITERS = {}
 
     def __init__(self, network_name, user_name):
         """
@@ -75,6 +94,7 @@ class Social:
         # If no errors, init object
         self.network_name = network_name
         self.user_name = user_name
+        self.adapter = networks.get_adapter(network_name)
 
         # Instantiate other packages if necessary
         self.instantiate_external_package()
@@ -87,411 +107,350 @@ class Social:
         :return: bool
         """
 
-        return network_name in cls.NETWORKS
+        return networks.is_managed(network_name)
 
     def instantiate_external_package(self):
         """
-        Only redirect to the correct function, using the network name.
+        Instantiate the external package of the network adapter, only one time.
         :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
         """
 
-        if self.network_name not in self.NETWORKS:
-            exit("Not managed network.")
-
-        # Redirect, using self.network_name
-        return eval('self.instantiate_external_package__'+self.network_name+'()')
+        # Each adapter has its own lock, so a slow instantiation (ex: WhatsApp login) doesn't block other networks
+        with self.adapter.lock:
+            return self.adapter.instantiate()
 
-    def instantiate_external_package__instagram(self):
+    def download_profile_picture(self):
         """
-        Instantiate "instaloader" package
-        :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
+        Get the profile picture URL, using the network name, then download and store the picture.
+        A cached URL is only revalidated: if it fails (ex: expired CDN URL), the profile is looked up again.
+        :return: dict - success of the process, image path, and birthday if the network gives it
         """
 
-        # Do not process if object has already been instantiated
-        if Social.IG is not None:
-            return
+        # Get profile picture URL, and download it
+        process = self.get_profile_picture_url()
+        result = self.save_lookup(process)
 
-        try:
-            # Prepare file path
-            folder_path = os.path.join(userdata_path, self.network_name)
-            folder_path = os.path.join(folder_path, '{target}')
-
-            # Init Instaloader
-            Social.IG = instaloader.Instaloader(dirname_pattern=folder_path, quiet=True)
-
-            # Overwrite function, for disable print errors
-            def nothing(msg, repeat_at_end=True):
-                pass
-            Social.IG.context.error = nothing
-            
-        except Exception as err:
-            return {
-                "success": False,
-                "error": str(err),
-            }
-
-    def instantiate_external_package__facebook(self):
-        """
-        Instantiate "facebook-scrapper" package
-        :return: void - nothing to return
-        """
+        # If the cached URL can't be downloaded anymore, look up the profile again
+        if result["success"] is False and process.get("cached") is True:
+            Metrics.get_current().count('lookup_cache_stale', network=self.network_name)
+            self.get_profile_cache().delete(self.network_name, self.user_name)
+            result = self.save_lookup(self.get_profile_picture_url(use_cache=False))
 
-        # Nothing to instantiate
-        return
+        return result
 
-    def instantiate_external_package__whatsapp(self):
+    async def download_profile_picture_async(self, semaphore=None, lookup_semaphore=None):
         """
-        Instantiate "selenium" package, open Chrome and wait for the user to log into their account
-        :return: void|dict - void if object has already been instantiated, or dict if there is an error during the process
+        Asynchronous variant of download_profile_picture().
+        Blocking network packages and downloads are run in the Social executor, so many pictures can be in flight.
+        :param semaphore: asyncio.Semaphore|None - limit the number of downloads in flight
+        :param lookup_semaphore: asyncio.Semaphore|None - limit the number of concurrent lookups on this network
+        :return: dict - success of the process, image path, and birthday if the network gives it
         """
 
-        # Do not process if object has already been instantiated
-        if Social.WA is not None:
-            return
+        # Get profile picture URL
+        process = await self.get_profile_picture_url_async(lookup_semaphore)
+        if process["success"] is False:
+            return process
 
         try:
 
-            # Init web browser
-            options = webdriver.ChromeOptions()
-            # options.binary_location = "C:/Program Files/BraveSoftware/Brave-Browser/Application/brave.exe"
-            service = ChromeService()
-            driver = webdriver.Chrome(service=service, options=options)
-
-            # Open 'WhatsApp Web' in Chrome
-            driver.get("https://web.whatsapp.com/")
-
-            # Wait for the user to log into their account
-            input('\n    \u001b[33mLog in to WhatsApp Web manually, then press Enter once the page loads.\u001b[0m')
-
-            # Save Selenium instance
-            Social.WA = driver
+            # Download photo_url, and store it
+            image_path = await self.save_profile_picture_async(process["url"], semaphore)
 
         except Exception as err:
-            return {
-                "success": False,
-                "error": str(err),
-            }
 
-    def download_profile_picture(self):
-        """
-        Only redirect to the correct function, using the network name.
-        :return: dict - success of the process
-        """
+            # If the cached URL can't be downloaded anymore, look up the profile again
+            if process.get("cached") is not True:
+                return {
+                    "success": False,
+                    "error": str(err),
+                }
 
-        if self.network_name not in self.NETWORKS:
-            exit("Not managed network.")
+            Metrics.get_current().count('lookup_cache_stale', network=self.network_name)
+            self.get_profile_cache().delete(self.network_name, self.user_name)
+            process = await self.get_profile_picture_url_async(lookup_semaphore, use_cache=False)
+            if process["success"] is False:
+                return process
 
-        # Redirect, using self.network_name
-        return eval('self.download_profile_picture__'+self.network_name+'()')
+            try:
+                image_path = await self.save_profile_picture_async(process["url"], semaphore)
+            except Exception as err:
+                return {
+                    "success": False,
+                    "error": str(err),
+                }
 
-    def download_profile_picture__instagram(self):
+        # Return latest image
+        return {
+            "success": True,
+            "error": None,
+            "image_path": image_path,
+            "image_date": self.get_profile_picture_date(),
+            "birthday": process.get("birthday"),
+        }
+
+    def save_lookup(self, process):
         """
-        Use Instaloader, to get an Instagram profile picture.
-        :return: dict - success of the process, and image path
+        Download and store the picture of a profile lookup result.
+        :param process: dict - returned by get_profile_picture_url()
+        :return: dict - success of the process, image path, and birthday if the network gives it
         """
 
-        try:
-
-            # Instantiate instaloader.Profile class, for given user_name
-            user_profile = Profile.from_username(Social.IG.context, self.user_name)
+        if process["success"] is False:
+            return process
 
-            # Download image to 'user data' folder
-            # Social.IG.download_profile(user_name, profile_pic_only=True)
-            Social.IG.download_profilepic(user_profile)
+        try:
 
-            # If no errors, get downloaded image path
-            image_path = self.get_profile_pictures()
+            # Download photo_url, and store it
+            image_path = self.save_profile_picture(process["url"])
 
             # Return latest image
             return {
                 "success": True,
                 "error": None,
                 "image_path": image_path,
+                "image_date": self.get_profile_picture_date(),
+                "birthday": process.get("birthday"),
             }
 
-        except ProfileNotExistsException:
-            return {
-                "success": False,
-                "error": "user_not_found",
-            }
         except Exception as err:
             return {
                 "success": False,
                 "error": str(err),
             }
 
-    def download_profile_picture__facebook(self):
+    def get_cached_profile_picture_url(self):
         """
-        Use facebook-scraper, to get a Facebook profile picture.
-        :return: dict - success of the process, and image path
+        Return the profile picture URL from the lookups cache, if it's still valid.
+        :return: dict|None - success of the process, profile picture URL and birthday, or None if not cached
         """
 
-        try:
-
-            # Disable module warnings
-            old_warnings_filters = warnings.filters
-            warnings.filterwarnings('ignore')
+        entry = self.get_profile_cache().get(self.network_name, self.user_name)
+        if entry is None:
+            return None
 
-            # Disable print return
-            # sys.stdout = open(os.devnull, 'w')
-            # sys.stderr = open(os.devnull, 'w')
+        Metrics.get_current().count('lookup_cache_hits', network=self.network_name)
 
-            # Use facebook-scraper, for trying to get user data
-            profile_data = get_profile(self.user_name)
+        return {
+            "success": True,
+            "error": None,
+            "url": entry["url"],
+            "birthday": entry["birthday"],
+            "cached": True,
+        }
 
-            # Re-activate module warnings
-            warnings.filters = old_warnings_filters
+    def get_profile_picture_url(self, use_cache=True):
+        """
+        Get the profile picture URL, from the cache or with a lookup.
+        Lookups are limited by the network rate limiter, and retried if the network answers that we are rate limited.
+        :param use_cache: bool - return the cached URL if it's still valid, instead of looking up the profile
+        :return: dict - success of the process, and profile picture URL ('cached' is True if it comes from the cache)
+        """
 
-            # Enable print return
-            # sys.stdout = sys.__stdout__
-            # sys.stderr = sys.__stderr__
+        # Skip the profile lookup, if its result is still cached
+        if use_cache is True:
+            process = self.get_cached_profile_picture_url()
+            if process is not None:
+                return process
 
-            # Check if user has been found
-            if profile_data["Name"] == "Contenu introuvable":
-                return {
-                    "success": False,
-                    "error": "user_not_found",
-                }
+        limiter = self.get_rate_limiter(self.network_name)
 
-            # If no except, try to get profile picture
-            if not profile_data["profile_picture"]:
-                return {
-                    "success": False,
-                    "error": "picture_not_found",
-                }
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
 
-            # Get image URL
-            profile_picture_url = profile_data["profile_picture"]
+            # Wait for a token of this network
+            limiter.acquire()
 
-            # Download photo_url, and store it
-            image_path = self.save_profile_picture(profile_picture_url)
+            process = self.lookup_profile_picture_url()
+            if process["error"] != "rate_limited":
+                break
 
-            # Return latest image
-            return {
-                "success": True,
-                "error": None,
-                "image_path": image_path,
-            }
+            # Pause this network, before retrying
+            if attempt < RATE_LIMIT_RETRIES:
+                Metrics.get_current().count('rate_limit_backoffs', network=self.network_name)
+                limiter.backoff(attempt)
 
-        except HTTPError as err:
-            if '404' in str(err):
-                return {
-                    "success": False,
-                    "error": "user_not_found",
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": "http_error",
-                }
-        except Exception as err:
-            if '(cookies) is required' in str(err):
-                return {
-                    "success": False,
-                    "error": "user_private",
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": str(err),
-                }
+        return process
 
-    def download_profile_picture__whatsapp(self):
+    async def get_profile_picture_url_async(self, lookup_semaphore=None, use_cache=True):
         """
-        Use Selenium, to get a What's App account profile picture.
-        :return: dict - success of the process, and image path
+        Asynchronous variant of get_profile_picture_url().
+        Waiting for a token or a backoff doesn't hold a thread nor a lookup slot, so other networks go on meanwhile.
+        :param lookup_semaphore: asyncio.Semaphore|None - limit the number of concurrent lookups on this network
+        :param use_cache: bool - return the cached URL if it's still valid, instead of looking up the profile
+        :return: dict - success of the process, and profile picture URL ('cached' is True if it comes from the cache)
         """
 
-        try:
+        # Skip the profile lookup, if its result is still cached
+        if use_cache is True:
+            process = self.get_cached_profile_picture_url()
+            if process is not None:
+                return process
 
-            # Limit for the number of search attempts
-            max_attempts = 5
-            attempts = 0
+        loop = asyncio.get_running_loop()
+        limiter = self.get_rate_limiter(self.network_name)
 
-            # Declare Selenium var
-            driver = Social.WA
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
 
-            while attempts < max_attempts:
-                try:
+            # Wait for a token of this network
+            await asyncio.sleep(limiter.reserve())
 
-                    # Search for the user's conversation using their phone number
-                    search_box = driver.find_element(By.XPATH, '//div[@title="Champ de recherche"]')
+            if lookup_semaphore is None:
+                process = await loop.run_in_executor(self.get_executor(), self.lookup_profile_picture_url)
+            else:
+                async with lookup_semaphore:
+                    process = await loop.run_in_executor(self.get_executor(), self.lookup_profile_picture_url)
+
+            if process["error"] != "rate_limited":
+                break
 
-                    # Clear the search field
-                    search_box.clear()
+            # Pause this network, before retrying
+            if attempt < RATE_LIMIT_RETRIES:
+                Metrics.get_current().count('rate_limit_backoffs', network=self.network_name)
+                limiter.backoff(attempt)
 
-                    # Enter the username in the search field
-                    search_box.send_keys(self.user_name)
+        return process
 
-                    # Wait for the results to load
-                    time.sleep(2)
+    def lookup_profile_picture_url(self):
+        """
+        Look up the profile picture URL with the network adapter, and cache the found URL.
+        :return: dict - success of the process, profile picture URL, and birthday if the network gives it
+        """
 
-                    # Find the conversation, and click on it
-                    conversation = driver.find_element(By.XPATH, '//span[@title="' + self.user_name + '"]')
-                    conversation.click()
+        with Metrics.get_current().span('lookup', self.network_name) as span:
+            process = self.adapter.get_profile_picture_url(self.user_name)
+            span["error"] = process["error"]
 
-                    # Wait for the conversation to load
-                    time.sleep(2)
+        # Cache the found URL
+        if process["success"] is True:
+            self.get_profile_cache().set(self.network_name, self.user_name, process["url"], process.get("birthday"))
 
-                    # Find the element containing the profile details, and click on it
-                    profile_container = driver.find_element(By.XPATH, '//div[@title="Détails du profil"]')
-                    profile_container.click()
+        return process
 
-                    # Wait for the profile to load
-                    time.sleep(2)
+    def save_profile_picture(self, photo_url):
+        """
+        Download given image URL into the image store, and add it to the user history.
+        The image is added only if it's not identical to the last one (same content hash).
+        :param photo_url: string - image URl to query
+        :return: string - image path
+        """
 
-                    # Find the element containing the profile picture and retrieve the URL
-                    profile_photo = driver.find_element(By.XPATH, '//div[@class="_aigv _aig-"]').find_element(By.TAG_NAME, 'section').find_element(By.TAG_NAME, 'img')
-                    photo_url = profile_photo.get_attribute('src')
+        store = self.get_store()
 
-                    # Download photo_url, and store it
-                    photo_path = self.save_profile_picture(photo_url)
+        # Download the image, and get the hash of its content
+        with Metrics.get_current().span('download', self.network_name):
+            digest = store.download(photo_url)
 
-                    # Close the browser
-                    # driver.quit()
+        # Add it to the user history, if it's not the same as the previous, and get last image path
+        return store.add_to_history(self.network_name, self.user_name, digest)["image_path"]
 
-                    return {
-                        "success": True,
-                        "error": None,
-                        "image_path": photo_path,
-                    }
+    async def save_profile_picture_async(self, photo_url, semaphore=None):
+        """
+        Asynchronous variant of save_profile_picture().
+        :param photo_url: string - image URl to query
+        :param semaphore: asyncio.Semaphore|None - limit the number of downloads in flight
+        :return: string - image path
+        """
 
-                except NoSuchElementException:
+        loop = asyncio.get_running_loop()
 
-                    # TODO : Check if the user hasn't logged into their account
-                    # try:
-                    #     # Try to find the element
-                    #     element = driver.find_element(By.CLASS_NAME, 'vsc-initialized')
-                    # except NoSuchElementException:
-                    #     # If the element is not found, that mean there is a problem with page loading
-                    #     raise Exception("page is not loaded correctly")
+        if semaphore is None:
+            return await loop.run_in_executor(self.get_executor(), self.save_profile_picture, photo_url)
 
-                    # If no conversation found, reset the search input
-                    reset_search_box_button = driver.find_element(By.XPATH, '//button[@aria-label="Annuler la recherche"]')
-                    reset_search_box_button.click()
+        async with semaphore:
+            return await loop.run_in_executor(self.get_executor(), self.save_profile_picture, photo_url)
 
-                    # Increase attempt, and retry process
-                    attempts += 1
+    @classmethod
+    def get_executor(cls):
+        """
+        Return the executor used by asynchronous methods, to run blocking packages and downloads.
+        :return: concurrent.futures.ThreadPoolExecutor
+        """
 
-            # If no conversation is found after a certain number of attempts, display an error message
-            raise Exception(f"No conversation found after {max_attempts} attempts for this user.")
-            # driver.quit()
+        with cls.LOCK:
+            if cls.EXECUTOR is None:
+                cls.EXECUTOR = ThreadPoolExecutor(max_workers=ASYNC_DOWNLOAD_CONCURRENCY, thread_name_prefix='social')
 
-        except Exception as err:
-            return {
-                "success": False,
-                "error": str(err),
-            }
+        return cls.EXECUTOR
 
-    def save_profile_picture(self, photo_url):
+    @classmethod
+    def get_store(cls):
         """
-        Download given image URL, and save it in the correct path.
-        :param photo_url: string - image URl to query
-        :return: string - image path
+        Return the image store, shared by all users and networks.
+        :return: ImageStore
         """
 
-        # Prepare file name to set
-        if len(self.get_profile_pictures(False)):
-            date_to_use = datetime.now()
-        else:
-            date_to_use = datetime(1971, 1, 1)
+        with cls.LOCK:
+            if cls.STORE is None:
+                cls.STORE = ImageStore()
 
-        file_name = date_to_use.strftime("%Y-%m-%d_%H-%M-%S") + '.jpg'
+        return cls.STORE
 
-        file_date = date_to_use.timestamp()
+    @classmethod
+    def get_profile_cache(cls):
+        """
+        Return the profile lookups cache, shared by all users and networks.
+        :return: ProfileCache
+        """
 
-        # Prepare file path
-        folder_path = os.path.join(userdata_path, self.network_name)
-        folder_path = os.path.join(folder_path, self.user_name)
-        file_path = os.path.join(folder_path, file_name)
+        with cls.LOCK:
+            if cls.PROFILE_CACHE is None:
+                cls.PROFILE_CACHE = ProfileCache()
 
-        # Create folder if not exist
-        if not os.path.exists(folder_path):
-            os.makedirs(os.path.join(folder_path))
+        return cls.PROFILE_CACHE
 
-        # Create an empty file
-        if not exists(file_path):
+    @classmethod
+    def get_rate_limiter(cls, network_name):
+        """
+        Return the rate limiter of a social network, shared by all its users.
+        :param network_name: string
+        :return: RateLimiter
+        """
 
-            # Télécharger la photo de profil
-            response = requests.get(photo_url)
+        with cls.LOCK:
+            if network_name not in cls.RATE_LIMITERS:
+                cls.RATE_LIMITERS[network_name] = RateLimiter(**RATE_LIMITS.get(network_name, {}))
 
-            if response.status_code == 200:
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
-            else:
-                raise Exception("Impossible de télécharger la photo de profil.")
-
-            # with open(file_path, 'wb') as handle:
-            #
-            #     # Get image content
-            #     response = requests.get(photo_url, stream=True)
-            #
-            #     if not response.ok:
-            #         print(response)
-            #
-            #     # Fill the empty file with image content
-            #     for block in response.iter_content(1024):
-            #         if not block:
-            #             break
-            #
-            #         handle.write(block)
-
-            # Set file dates (first parameter is atime, and second is mtime)
-            os.utime(file_path, (file_date, file_date))
-
-        # Delete this image if it's the same as the previous
-        self.delete_duplicated_image()
-
-        # If no errors, get last image path
-        image_path = self.get_profile_pictures()
-
-        return image_path
+        return cls.RATE_LIMITERS[network_name]
 
     def get_profile_pictures(self, get_only_last=True):
         """
-        Return downloaded image, for a specific user and social network, order by modified date DESC.
+        Return downloaded image, for a specific user and social network, order by date DESC.
         :param get_only_last: bool - return only last images, or all images
         :return: array|string - contains image path
         """
 
-        # Get image path
-        image_path = os.path.join(userdata_path, self.network_name)
-        image_path = os.path.join(image_path, self.user_name)
+        # Get latest image, with an indexed lookup
+        if get_only_last is True:
+            last = self.get_store().get_last(self.network_name, self.user_name)
+            return last["image_path"] if last is not None else None
 
-        # Filter only images
-        files = glob.glob(image_path + '/*.jpg')
+        # Else, get image paths from user history
+        return [entry["image_path"] for entry in self.get_store().get_history(self.network_name, self.user_name)]
 
-        # Order files by modified date ASC
-        paths = sorted(files, key=os.path.getmtime)
+    def get_profile_picture_date(self):
+        """
+        Return the date of the last downloaded image, for a specific user and social network.
+        :return: float|None - timestamp
+        """
 
-        # Reverse array
-        paths.reverse()
+        last = self.get_store().get_last(self.network_name, self.user_name)
 
-        # Return latest image
-        if len(paths) and get_only_last is True:
-            return paths[0]
-        elif len(paths) and get_only_last is False:
-            return paths
-        elif not len(paths) and get_only_last is False:
-            return []
-        else:
-            return None
+        return last["date"] if last is not None else None
 
     def delete_duplicated_image(self):
         """
-        Check if the last downloaded image is identical to the previous one, and delete it if it's true.
+        Check if the last downloaded image is identical to the previous one, and delete it from history if it's true.
+        Images are compared by their content hash, then by their indexed perceptual hash, so they are decoded at most
+        one time.
         :return: void
         """
 
-        # Get image path
-        images = self.get_profile_pictures(False)
+        # Get the last two images of user history
+        history = self.get_store().get_history(self.network_name, self.user_name, limit=2)
 
-        if len(images) < 2:
+        if len(history) < 2:
             return
 
-        im1 = Image.open(images[0])
-        im2 = Image.open(images[1])
-
         # If images are identical, we delete the last one
-        if list(im1.getdata()) == list(im2.getdata()):
-            os.remove(images[0])
+        if self.get_store().is_similar(history[0]["digest"], history[1]["digest"]):
+            self.get_store().remove_from_history(self.network_name, self.user_name, history[0]["digest"])
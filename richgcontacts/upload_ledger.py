@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+
+class UploadLedger:
+    """
+    Persistent record of the last photo uploaded for each contact.
+    For each resource name, it keeps the hash of the uploaded image and the contact etag returned by the upload. If
+    the chosen image and the contact etag are unchanged since then, the upload can be skipped.
+
+    Attributes
+    ----------
+    path : string
+        path to the ledger file
+    entries : dict
+        for each resource name, a dict with 'digest' and 'etag'
+    lock : threading.Lock
+        protect entries, when contacts are processed concurrently
+
+    Methods
+    -------
+    is_uploaded(resource_name, digest, etag)
+        Check if an image is already the photo of a contact.
+    record(resource_name, digest, etag)
+        Record an uploaded photo.
+    refresh(resource_name, etag)
+        Record the new etag of a contact updated without photo change.
+    save()
+        Write the ledger file.
+    """
+
+    def __init__(self, path):
+        """
+        Load the ledger file, if it exists.
+        :param path: string - path to the ledger file
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_uploaded(self, resource_name, digest, etag):
+        """
+        Check if an image is already the photo of a contact: it's the last uploaded image, and the contact has not
+        been modified since this upload.
+        :param resource_name: string - contact resource name
+        :param digest: string - hash of the image content
+        :param etag: string - current contact etag
+        :return: bool
+        """
+
+        with self.lock:
+            entry = self.entries.get(resource_name)
+
+        return entry is not None and entry["digest"] == digest and entry["etag"] == etag
+
+    def record(self, resource_name, digest, etag):
+        """
+        Record an uploaded photo.
+        :param resource_name: string - contact resource name
+        :param digest: string - hash of the uploaded image content
+        :param etag: string|None - contact etag returned by the upload
+        :return: void
+        """
+
+        with self.lock:
+            self.entries[resource_name] = {
+                "digest": digest,
+                "etag": etag,
+            }
+
+    def refresh(self, resource_name, etag):
+        """
+        Record the new etag of a contact updated without photo change (ex: birthday update), so its photo is still
+        considered as uploaded.
+        :param resource_name: string - contact resource name
+        :param etag: string|None - contact etag returned by the update
+        :return: void
+        """
+
+        with self.lock:
+            if resource_name in self.entries:
+                self.entries[resource_name]["etag"] = etag
+
+    def save(self):
+        """
+        Write the ledger file.
+        :return: void
+        """
+
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            with open(self.path + '.part', 'w') as file:
+                json.dump(self.entries, file)
+
+            os.replace(self.path + '.part', self.path)